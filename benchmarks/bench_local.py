@@ -0,0 +1,245 @@
+"""
+Batch size vs throughput for the Local provider, against a stand-in CPU server.
+
+The stand-in speaks the OpenAI /v1/chat/completions and /v1/completions (with a
+list of prompts) endpoints and answers with SimulatedModel responses. It models a
+single CPU inference server: requests are processed one at a time, and a request
+with b prompts costs
+    prefill_s_per_token * (all prompt tokens)
+    + decode_steps * step_s * (1 + batch_overhead * (b - 1))
+so a batch shares each decode step between its prompts, at a cost per extra prompt.
+
+    python -m benchmarks.bench_local --n 200 --concurrency 16 --time-scale 0.01
+    python -m benchmarks.bench_local --serve --port 8080   # stand-in only
+
+Point --base-url at a real llama.cpp or vLLM server to measure it instead.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from models.local import Local
+from models.simulated import SimulatedModel
+from util.scoring import get_prompt, load_requirements, score_requirement
+
+
+class StandInServer:
+    """
+    Stand-in OpenAI-compatible CPU server.
+
+    Args:
+        prefill_s_per_token (float): Seconds per prompt token.
+        step_s (float): Seconds per decode step for a single sequence.
+        batch_overhead (float): Extra cost of a decode step per additional sequence.
+        time_scale (float): Multiplier on all simulated time.
+    """
+
+    def __init__(
+        self,
+        port: int = 0,
+        prefill_s_per_token: float = 0.0005,
+        step_s: float = 0.02,
+        batch_overhead: float = 0.15,
+        time_scale: float = 1.0,
+    ):
+        self.prefill_s_per_token = prefill_s_per_token
+        self.step_s = step_s
+        self.batch_overhead = batch_overhead
+        self.time_scale = time_scale
+        self._compute = threading.Lock()  # One request on the CPU at a time
+        self._responder = SimulatedModel(model_name="stand-in", time_scale=0)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.endswith("/chat/completions"):
+                    system, user = (m["content"] for m in body["messages"][:2])
+                    payload = server.chat(body["model"], system, user)
+                elif self.path.endswith("/completions"):
+                    prompts = body["prompt"]
+                    payload = server.complete(
+                        body["model"], prompts if isinstance(prompts, list) else [prompts]
+                    )
+                else:
+                    self.send_error(404)
+                    return
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.port = self._httpd.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def start(self) -> "StandInServer":
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+
+    def _generate(self, prompts: List[str]) -> List[str]:
+        texts = [self._responder._response(prompt) for prompt in prompts]
+        prompt_tokens = sum(len(p) // 4 for p in prompts)
+        decode_steps = max(len(t) // 4 for t in texts)
+        seconds = (
+            self.prefill_s_per_token * prompt_tokens
+            + decode_steps * self.step_s * (1 + self.batch_overhead * (len(prompts) - 1))
+        )
+        with self._compute:
+            time.sleep(seconds * self.time_scale)
+        return texts
+
+    def chat(self, model: str, system: str, user: str) -> dict:
+        prompt = f"{system}\n\n{user}"
+        (text,) = self._generate([prompt])
+        return {
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(text) // 4,
+                "total_tokens": (len(prompt) + len(text)) // 4,
+            },
+        }
+
+    def complete(self, model: str, prompts: List[str]) -> dict:
+        texts = self._generate(prompts)
+        return {
+            "id": "cmpl-standin",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {"index": i, "text": text, "finish_reason": "stop", "logprobs": None}
+                for i, text in enumerate(texts)
+            ],
+            "usage": {
+                "prompt_tokens": sum(len(p) // 4 for p in prompts),
+                "completion_tokens": sum(len(t) // 4 for t in texts),
+                "total_tokens": sum(len(p) + len(t) for p, t in zip(prompts, texts)) // 4,
+            },
+        }
+
+
+def run_batch_size(
+    batch_size: int,
+    rows: list,
+    base_url: str,
+    system_prompt: str,
+    concurrency: int,
+    time_scale: float,
+    model_name: str = "gemma-3-270m",
+) -> dict:
+    model = Local(
+        model_name=model_name,
+        system_prompt=system_prompt,
+        base_url=base_url,
+        max_batch_size=batch_size,
+        batch_window=0.05 * time_scale,
+    )
+    latencies = []
+
+    def score(row):
+        start = time.perf_counter()
+        result = score_requirement(model, *row)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(score, rows))
+    wall = time.perf_counter() - start
+    stats = model.batch_stats()
+    latencies = np.array(latencies) / time_scale
+    return {
+        "max_batch_size": batch_size,
+        "mean_batch_size": stats["mean_batch_size"],
+        "scored": sum(r is not None for r in results),
+        "requirements_per_s": len(rows) / (wall / time_scale),
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local provider batching benchmark")
+    parser.add_argument("--n", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    parser.add_argument("--base-url", help="Real server to benchmark instead of the stand-in")
+    parser.add_argument("--model-name", default="gemma-3-270m")
+    parser.add_argument("--serve", action="store_true", help="Only run the stand-in server")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    if args.serve:
+        server = StandInServer(port=args.port, time_scale=1.0).start()
+        print(f"Stand-in server on {server.base_url}")
+        threading.Event().wait()
+
+    server: Optional[StandInServer] = None
+    base_url, time_scale = args.base_url, args.time_scale
+    if base_url is None:
+        server = StandInServer(time_scale=time_scale).start()
+        base_url = server.base_url
+    else:
+        time_scale = 1.0  # Real servers run in real time
+
+    system_prompt = get_prompt("scoring_v4.txt", prompt_dir="prompts/scoring")
+    with contextlib.redirect_stdout(io.StringIO()):
+        requirements_df = load_requirements(n=args.n)
+    rows = [(row["Requirement"], row["Type"]) for _, row in requirements_df.iterrows()]
+    try:
+        report = [
+            run_batch_size(
+                size,
+                rows,
+                base_url,
+                system_prompt,
+                args.concurrency,
+                time_scale,
+                args.model_name,
+            )
+            for size in args.batch_sizes
+        ]
+    finally:
+        if server:
+            server.stop()
+
+    print("Latencies in unscaled seconds")
+    print(pd.DataFrame(report).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
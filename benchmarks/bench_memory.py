@@ -0,0 +1,109 @@
+"""
+Memory footprint of RequirementResult lists vs ResultTable.
+
+Results are generated with simulated mixture_of_opinions_v2 responses for several
+model names. The re-score response is a copy of the score response, so it is
+deduplicated by the blob store, and simulated justifications compress better than
+real ones; expect smaller savings on real results. The benchmark then measures the
+memory held by each representation with tracemalloc, and checks that the
+ResultTable export is identical.
+
+    python -m benchmarks.bench_memory --n 1000 --models 12
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Iterator, Tuple
+
+import pandas as pd
+
+from models.simulated import SimulatedModel
+from util.result_store import BlobStore, ResultTable
+from util.scoring import RequirementResult, get_prompt, load_requirements, score_requirement
+
+
+def generate(requirements_df: pd.DataFrame, n_models: int) -> Iterator[RequirementResult]:
+    system_prompt = get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring")
+    rows = [(row["Requirement"], row["Type"]) for _, row in requirements_df.iterrows()]
+    for m in range(n_models):
+        model = SimulatedModel(
+            model_name=f"simulated-{m}", system_prompt=system_prompt, time_scale=0
+        )
+        for requirement, req_type in rows:
+            result = score_requirement(model, requirement, req_type)
+            # Refined fields as a full refine + re-score round would leave them
+            result.refined_requirement = requirement + " (refined)"
+            result.refined_response = {"refined_requirement": result.refined_requirement}
+            result.refined_score = result.overall_score
+            result.refined_score_raw_response = result.score_response
+            yield result
+
+
+def measure(build: Callable[[], object]) -> Tuple[int, float, object]:
+    """Bytes still allocated after `build()` returns, with the object kept alive."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = build()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, seconds, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Result memory benchmark")
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--models", type=int, default=12)
+    args = parser.parse_args()
+
+    # Simulated responses are cheap; precompute them so generation is not measured
+    with contextlib.redirect_stdout(io.StringIO()):
+        requirements_df = load_requirements(n=args.n)
+        dicts = [r.__dict__ for r in generate(requirements_df, args.models)]
+    # Fresh objects for every build, as parsing each response would produce
+    copies = lambda: (RequirementResult(**json.loads(json.dumps(d))) for d in dicts)
+
+    spill_dir = tempfile.mkdtemp(prefix="blobs-")
+    rows = []
+    try:
+        variants = [
+            ("dataclass list", lambda: list(copies())),
+            ("ResultTable (memory blobs)", lambda: ResultTable.from_results(copies())),
+            (
+                "ResultTable (spilled blobs)",
+                lambda: ResultTable.from_results(copies(), BlobStore(spill_dir)),
+            ),
+        ]
+        for name, build in variants:
+            current, seconds, kept = measure(build)
+            if isinstance(kept, ResultTable):
+                assert kept.to_dicts() == dicts, "ResultTable export differs"
+            rows.append(
+                {
+                    "representation": name,
+                    "results": len(kept),
+                    "MiB": current / 2**20,
+                    "bytes_per_result": current / len(kept),
+                    "build_s": seconds,
+                }
+            )
+            del kept
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    table = pd.DataFrame(rows)
+    table["vs_dataclass"] = table["MiB"] / table["MiB"].iloc[0]
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
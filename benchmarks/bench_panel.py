@@ -0,0 +1,109 @@
+"""
+Compare the monolithic mixture_of_opinions_v2 prompt with the parallel expert panel.
+
+The monolithic prompt generates every expert's assessment in one response, so its
+latency grows with the output length. The panel runs one shorter call per expert
+concurrently; with a quorum it also stops once the pass/fail outcome is fixed.
+Simulated providers generate `--tokens-per-second` output tokens per second.
+
+    python -m benchmarks.bench_panel --n 200 --time-scale 0.01
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from models.simulated import SimulatedModel
+from util.panel import ExpertPanel
+from util.scoring import get_prompt, load_requirements, score_requirement
+
+
+def _simulated(system_prompt: str, args, seed: int = 42) -> SimulatedModel:
+    return SimulatedModel(
+        model_name="simulated",
+        system_prompt=system_prompt,
+        latency_median=args.ttft,
+        output_tokens_per_second=args.tokens_per_second,
+        time_scale=args.time_scale,
+        seed=seed,
+    )
+
+
+def run_monolithic(requirements_df: pd.DataFrame, args) -> dict:
+    model = _simulated(
+        get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring"), args
+    )
+    rows = [(row["Requirement"], row["Type"]) for _, row in requirements_df.iterrows()]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda row: score_requirement(model, *row), rows))
+    wall = time.perf_counter() - start
+    latencies = np.array(model.request_latencies) / args.time_scale
+    return {
+        "mode": "monolithic",
+        "scored": sum(r is not None for r in results),
+        "calls": model.calls,
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+        "wall_s": wall / args.time_scale,
+    }
+
+
+def run_panel(requirements_df: pd.DataFrame, args, quorum=None) -> dict:
+    seeds = iter(range(100))
+    panel = ExpertPanel.from_prompt(
+        lambda prompt: _simulated(prompt, args, seed=next(seeds)),
+        quorum=quorum,
+        threshold=args.threshold,
+        max_workers=args.concurrency * 4,
+    )
+    start = time.perf_counter()
+    results = panel.score_all(
+        requirements_df, max_concurrent=args.concurrency, progress=False
+    )
+    wall = time.perf_counter() - start
+    stats = panel.stats.summary()
+    latencies = np.array(panel.stats.latencies) / args.time_scale
+    return {
+        "mode": f"panel (quorum={quorum})" if quorum else "panel",
+        "scored": len(results),
+        "calls": stats["expert_calls"],
+        "cancelled": stats["cancelled"],
+        "abandoned": stats["abandoned"],
+        "early_decisions": stats["early_decisions"],
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+        "wall_s": wall / args.time_scale,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monolithic vs parallel expert panel")
+    parser.add_argument("--n", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--threshold", type=int, default=50)
+    parser.add_argument("--quorum", type=int, default=3)
+    parser.add_argument("--ttft", type=float, default=1.0, help="Median seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    args = parser.parse_args()
+
+    requirements_df = load_requirements(n=args.n)
+    # Scoring prints on every parse failure; keep the comparison readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = [
+            run_monolithic(requirements_df, args),
+            run_panel(requirements_df, args),
+            run_panel(requirements_df, args, quorum=args.quorum),
+        ]
+    print("Latencies in simulated (unscaled) seconds")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
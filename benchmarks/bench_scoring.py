@@ -0,0 +1,124 @@
+"""
+Benchmark the scoring pipeline against simulated providers.
+
+Each scenario runs `score_with_model` over the same requirements with a
+SimulatedModel configured for a particular provider behaviour and reports
+throughput, tail latency, retry counts and wall-clock time per 1k requirements.
+
+    python -m benchmarks.bench_scoring --n 1000 --workers 8 --time-scale 0.01
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from models.simulated import SimulatedModel
+from util.scoring import load_requirements, score_with_model
+
+SCENARIOS: Dict[str, Dict[str, float]] = {
+    "clean": {},
+    "markdown_wrapped": {"markdown": 0.3},
+    "truncated_json": {"truncated": 0.1},
+    "rate_limited": {"rate_limit": 0.1},
+    "flaky_5xx": {"server_error": 0.05, "empty": 0.02},
+    "timeouts": {"timeout": 0.02},
+    "mixed": {
+        "rate_limit": 0.05,
+        "server_error": 0.02,
+        "timeout": 0.01,
+        "truncated": 0.05,
+        "markdown": 0.2,
+    },
+}
+
+
+def _requirements(csv_file: str, n: int) -> pd.DataFrame:
+    # requirements.csv has fewer than 1k rows, so repeat it to reach n
+    df = load_requirements(csv_file, n=len(pd.read_csv(csv_file)))
+    repeats = -(-n // len(df))
+    return pd.concat([df] * repeats, ignore_index=True).head(n)
+
+
+def run_scenario(
+    name: str,
+    fault_rates: Dict[str, float],
+    requirements_df: pd.DataFrame,
+    workers: int = 1,
+    time_scale: float = 0.01,
+    seed: int = 42,
+) -> Dict[str, float]:
+    model = SimulatedModel(
+        model_name=f"simulated-{name}",
+        fault_rates=fault_rates,
+        time_scale=time_scale,
+        retry_delay=0.2 * time_scale,
+        retry_jitter=time_scale,
+        seed=seed,
+    )
+    chunks = [
+        requirements_df.iloc[i::workers] for i in range(min(workers, len(requirements_df)))
+    ]
+
+    # The retry loop and JSON parsing print on every failure; keep the report readable
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results: List = [
+                r
+                for chunk_results in pool.map(
+                    lambda chunk: score_with_model(model, chunk, progress=False),
+                    chunks,
+                )
+                for r in chunk_results
+            ]
+    wall = time.perf_counter() - start
+
+    latencies = np.array(model.request_latencies) / time_scale
+    n = len(requirements_df)
+    return {
+        "scenario": name,
+        "requests": n,
+        "scored": len(results),
+        "calls": model.calls,
+        "retries": model.retries,
+        "throughput_rps": n / wall,
+        # Latencies are reported in simulated (unscaled) seconds
+        "p50_s": float(np.percentile(latencies, 50)),
+        "p95_s": float(np.percentile(latencies, 95)),
+        "p99_s": float(np.percentile(latencies, 99)),
+        "wall_per_1k_s": wall * 1000 / n / time_scale,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated scoring benchmark")
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=0.01,
+        help="Multiplier on simulated latency (0.01 runs 100x faster than real time)",
+    )
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), action="append")
+    parser.add_argument(
+        "--csv", default="data/software-requirements-dataset/requirements.csv"
+    )
+    args = parser.parse_args()
+
+    requirements_df = _requirements(args.csv, args.n)
+    rows = [
+        run_scenario(name, SCENARIOS[name], requirements_df, args.workers, args.time_scale)
+        for name in (args.scenario or SCENARIOS)
+    ]
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
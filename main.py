@@ -10,90 +10,32 @@ from models.grok import Grok
 from models.mistral import MistralModel
 from models.qwen import Qwen
 from models.together import Together
-
+from models.router import RoutedModel
+from models.local import Local
+
+from util.pre_classifier import PreClassifier, load_quality_data
+from util.semantic_cache import ScoreIndex
+from util.scoring import (
+    RequirementResult,
+    get_prompt,
+    extract_basic_score,
+    refine_requirement,
+    load_requirements,
+    score_with_model,
+    write_model_results,
+)
+from util.pipeline import run_pipeline
+from util.refinement_loop import RefinementLoop, print_report
+from util.panel import ExpertPanel
+from util.manifest import IncrementalRun
 from util.json_utils import clean_json_output
+from util import telemetry
+from util.telemetry import JsonlSink, MemoryAggregator, PrometheusSink
+from util import tokens
+from util.tokens import TokenBudget
 
-import pandas as pd
 from typing import Dict, List, Optional
 
-from dataclasses import dataclass
-
-import tqdm
-import re  # cleaning text
-
-
-@dataclass
-class RequirementResult:
-    original_requirement: str
-    requirement_type: str
-    model_name: str
-    score_response: str  # Store the full JSON response from scoring agent as string
-    overall_score: Optional[int] = None  # Score from scoring agent
-    refined_requirement: Optional[str] = (
-        None  # Refined requirement from refinement agent
-    )
-    refined_response: Optional[str] = None  # Full response from refinement agent
-    refined_score: Optional[int] = None  # Score from refinement agent, if applicable
-    refined_score_raw_response: Optional[str] = (
-        None  # Full JSON response from refinement agent, if applicable
-    )
-
-
-def get_prompt(prompt_name: str, prompt_dir: str = "prompts") -> str:
-    prompt_path: str = os.path.join(prompt_dir, prompt_name)
-    if not os.path.exists(prompt_path):
-        raise FileNotFoundError(
-            f"Prompt file '{prompt_name}' not found in '{prompt_dir}'."
-        )
-
-    with open(prompt_path, "r") as file:
-        return file.read().strip()
-
-
-def clean_text(text: str) -> str:
-    """Clean corrupted characters from text."""
-    if not isinstance(text, str):
-        return str(text)
-
-    # Common character encoding fixes
-    replacements = {
-        "â€œ": '"',  # Left double quotation mark
-        "â€": '"',  # Right double quotation mark
-        "â€™": "'",  # Right single quotation mark
-        "â€˜": "'",  # Left single quotation mark
-        'â€"': "—",  # Em dash
-        'â€"': "–",  # En dash
-        "Â": "",  # Non-breaking space artifacts
-    }
-
-    cleaned = text
-    for old, new in replacements.items():
-        cleaned = cleaned.replace(old, new)
-
-    # Remove any remaining non-ASCII characters that might cause issues
-    cleaned = re.sub(r"[^\x00-\x7F]+", "", cleaned)
-
-    return cleaned.strip()
-
-
-def df_from_csv_fraction(
-    csv_file: str, fraction: float = 1.0, random_state: int = 42
-) -> pd.DataFrame:
-    if not os.path.exists(csv_file):
-        raise FileNotFoundError(f"CSV file '{csv_file}' not found.")
-    df = pd.read_csv(csv_file)
-    if fraction < 1.0:
-        df = df.sample(frac=fraction, random_state=random_state)
-    return df
-
-
-def df_from_csv_n(csv_file: str, n: int, random_state: int = 42) -> pd.DataFrame:
-    if not os.path.exists(csv_file):
-        raise FileNotFoundError(f"CSV file '{csv_file}' not found.")
-    df = pd.read_csv(csv_file)
-    df = df.sample(n=n, random_state=random_state)
-    return df
-
 
 # factory function for creating models
 def create_model(
@@ -109,63 +51,41 @@ def create_model(
     return model_class(**params)
 
 
-def extract_basic_score(response: dict) -> Optional[int]:
-    """
-    Extract just the overall score
-    Returns score
-    """
-    try:
-        # Try different common score field names
-        score_fields = [
-            "overall_score",
-            "overall_quality_score",
-            "score",
-            "final_score",
-        ]
-
-        for field in score_fields:
-            if field in response:
-                score_value = response[field]
-                # Handle both integer and percentage string formats
-                if isinstance(score_value, str) and score_value.endswith("%"):
-                    return int(score_value.rstrip("%"))
-                elif isinstance(score_value, (int, float)):
-                    return int(score_value)
-
-        return None
-    except Exception as e:
-        print(f"Error extracting score: {e}")
-        return None
-
-
-def refine_requirement(
-    result: RequirementResult, refinement_model: BaseModel, refinement_input: str
-) -> RequirementResult:
-    """
-    Refines a requirement by passing the original requirement and full scoring response
-    """
-    # Create refinement prompt with original requirement and full scoring context
-    prompt = refinement_input.replace("{{ REQUIREMENT }}", result.original_requirement)
-    prompt = prompt.replace("{{ SCORING_ANALYSIS }}", result.raw_response)
-
-    refined_response = refinement_model.query_with_retry(prompt)
-
-    result.refined_response = refined_response
-    # Optionally extract just the refined requirement text if needed
-    # result.refined_requirement = extract_refined_requirement(refined_response)
-
-    return result
-
-
-def score_requirements():
-    csv_file: str = "data/software-requirements-dataset/requirements.csv"
-    requirements_df = df_from_csv_n(csv_file, n=100, random_state=42)
-
-    requirements_df["Requirement"] = requirements_df["Requirement"].apply(clean_text)
-
-    print(f"Loaded {len(requirements_df)} requirements from {csv_file}")
+def load_scoring_sample():
+    """The requirements score_requirements scores."""
+    return load_requirements(
+        "data/software-requirements-dataset/requirements.csv", n=100, random_state=42
+    )
+
+
+def score_requirements(
+    pre_classifier: Optional[PreClassifier] = None,
+    score_index: Optional[ScoreIndex] = None,
+    incremental: Optional[IncrementalRun] = None,
+):
+    requirements_df = load_scoring_sample()
     print(requirements_df.head())
 
+    # Triage locally so only the requirements that need a judge reach the LLMs
+    routes = {}
+    if pre_classifier:
+        decisions = pre_classifier.route(requirements_df["Requirement"].tolist())
+        routes = {decision.requirement: decision for decision in decisions}
+        skipped = sum(not decision.send_to_llm for decision in decisions)
+        print(
+            f"Pre-classifier routes {len(decisions) - skipped}/{len(decisions)} requirements to the LLM judges"
+        )
+        # Only meaningful for requirements the prior was not trained on
+        routing = pre_classifier.routing_report(decisions, load_quality_data())
+        if routing["held_out"]:
+            print(
+                f"Held-out routing accuracy {routing['routing_accuracy']:.2f} on "
+                f"{routing['held_out']} requirements already scored by the LLM judges "
+                f"({routing['missed_deficient']} deficient ones not sent)"
+            )
+        else:
+            print("No held-out LLM scores to check the routing against")
+
     scoring_prompt: str = get_prompt(
         "mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring"
     )
@@ -195,6 +115,8 @@ def score_requirements():
         #     system_prompt=scoring_prompt,
         # ),
         # Together(model_name="openai/gpt-oss-120b", system_prompt=scoring_prompt),
+        # Any endpoint serving the weights, picked by latency, errors and price:
+        # RoutedModel.from_routes("deepseek-v3", system_prompt=scoring_prompt),
         # Claude(
         #     model_name="claude-sonnet-4-20250514",
         #     system_prompt=scoring_prompt,
@@ -206,66 +128,83 @@ def score_requirements():
         # Google(model_name="gemini-2.5-flash-lite", system_prompt=scoring_prompt),
         # Google(model_name="gemma-3-4b", system_prompt=scoring_prompt),
         # Google(model_name="gemma-3-12b", system_prompt=scoring_prompt),
+        # Offline on a local llama.cpp/vLLM server ($LOCAL_BASE_URL), batching concurrent calls:
+        # Local(model_name="gemma-3-4b", system_prompt=scoring_prompt, max_batch_size=8),
     ]
 
-    # Create output directory
-    os.makedirs("results", exist_ok=True)
+    usage = telemetry.add_sink(MemoryAggregator())
 
     for model in scoring_models:
         print(f"Processing with model: {model.model_name}")
-        model_results = []
-
-        for idx, row in tqdm.tqdm(
-            requirements_df.iterrows(),
-            desc=f"Scoring with {model.model_name}",
-            total=len(requirements_df),
-        ):
-            req = row["Requirement"]
-            req_type = row["Type"]
-
-            response = model.query_with_retry(req)
-            if not response:
-                print(
-                    f"No response for requirement: {req} from model: {model.model_name}"
-                )
-                continue
-
-            cleaned_response = clean_json_output(response)
-
-            if not cleaned_response:
-                print(
-                    f"Failed to parse JSON response for requirement: {req} from model: {model.model_name}"
-                )
-                continue
-
-            overall_score = extract_basic_score(cleaned_response)
-
-            result = RequirementResult(
-                original_requirement=req,
-                requirement_type=req_type,
-                model_name=model.model_name,
-                score_response=cleaned_response,
-                overall_score=overall_score,
-                refined_requirement=None,
-                refined_response=None,
-                refined_score=None,
-                refined_score_raw_response=None,
+        if incremental:
+            # Only score cells whose inputs changed and merge them into the results file
+            incremental.score(model, requirements_df, routes, score_index)
+        else:
+            model_results = score_with_model(
+                model, requirements_df, routes, score_index
             )
 
-            model_results.append(result)
+            # Save this model's results immediately
+            write_model_results(model.model_name, model_results, output_dir="results")
+        usage.print_summary()
+
+    telemetry.remove_sink(usage)
 
-        # Save this model's results immediately
-        safe_model_name = re.sub(r"[^A-Za-z0-9_]", "_", model.model_name)
-        output_file_path = f"results/{safe_model_name}_scores.json"
-        with open(output_file_path, "w") as f:
-            json.dump([result.__dict__ for result in model_results], f, indent=4)
-        print(f"Results for {model.model_name} written to {output_file_path}")
+    if incremental:
+        incremental.print_report()
+
+    if score_index is not None:
+        for model_and_prompt, stats in score_index.report().items():
+            print(f"Reuse index for {model_and_prompt}: {stats}")
 
 
 if __name__ == "__main__":
 
+    # Every call is logged with latency, retries, tokens and estimated cost
+    telemetry.add_sink(JsonlSink("results/telemetry.jsonl"))
+    # telemetry.add_sink(PrometheusSink(port=9108))  # scrape http://127.0.0.1:9108/metrics
+
+    # Cap the spend of the run; calls that would exceed it raise BudgetExceeded
+    # tokens.set_budget(TokenBudget(max_cost=25.0))
+
     score_requirements()
 
+    # Triage with the local pre-classifier first (security requirements get their own prompt).
+    # The quality prior is trained without the sample it routes.
+    # pre_classifier = PreClassifier.train(
+    #     exclude=load_scoring_sample()["Requirement"],
+    #     category_prompts={"security": "scoring_v4.txt"},
+    # )
+    # score_requirements(pre_classifier=pre_classifier)
+
+    # Reuse scores of near-duplicate requirements, re-checking 10% of hits for drift
+    # (only scores made with the same system prompt are reused)
+    # score_index = ScoreIndex.from_results(
+    #     get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring"),
+    #     "results",
+    #     similarity_threshold=0.9,
+    #     verify_fraction=0.1,
+    # )
+    # score_requirements(score_index=score_index)
+
+    # Re-score only new requirements and those whose prompt or parameters changed
+    # since the last run (input hashes in results/manifest.json)
+    # score_requirements(incremental=IncrementalRun("results/manifest.json"))
+
+    # Split the mixture-of-opinions panel into concurrent single-expert calls and stop
+    # once 3 of 4 experts agree on pass/fail (python -m benchmarks.bench_panel compares latency)
+    # panel = ExpertPanel.from_prompt(
+    #     lambda prompt: GPT(model_name="gpt-4.1-mini", system_prompt=prompt),
+    #     threshold=70,
+    #     quorum=3,
+    # )
+    # write_model_results(panel.name, panel.score_all(load_requirements(n=100)))
+
+    # Spread scoring over several processes/hosts (each worker uses its own API keys):
+    #   python -m util.work_queue enqueue grids/scoring_sweep.json --db results/queue.db
+    #   python -m util.work_queue work --db results/queue.db --providers GPT Google
+    #   python -m util.work_queue merge --db results/queue.db --output-dir results
+
     # Rerun the oss 120 b 
     # single_model = Together(
     #     model_name="openai/gpt-oss-120b",
@@ -296,9 +235,26 @@ if __name__ == "__main__":
     #     json.dump([req_result.__dict__], f, indent=4)
 
     # # REFINE the requirements
+    # # Streaming score -> refine -> re-score with overlapping stages:
+    # results, stage_report = run_pipeline(
+    #     load_requirements(n=100),
+    #     scoring_model=GPT(model_name="gpt-4.1", system_prompt=scoring_prompt),
+    #     refinement_model=MistralModel(temperature=0.25),
+    #     refinement_template=get_prompt("refinement_v2.txt", prompt_dir="prompts/refinement"),
+    # )
+    # # Or refine until the checker is satisfied (stops early once the score passes or plateaus):
+    # states, loop_report = RefinementLoop(
+    #     refinement_model=MistralModel(temperature=0.25),
+    #     checker_model=GPT(model_name="gpt-4.1", system_prompt=scoring_prompt),
+    #     refinement_template=get_prompt("refinement_v2.txt", prompt_dir="prompts/refinement"),
+    #     threshold=70,
+    #     max_rounds=5,
+    # ).run(load_requirements(n=100))
+    # print_report(loop_report)
     # refinement_prompt: str = get_prompt("refinement_v2.txt", prompt_dir="prompts/refinement")
 
     # # TODO: Use this instead
+    # # (the sweep over these is declared in grids/refinement_sweep.json: python -m util.grid grids/refinement_sweep.json)
     # refinement_prompts: List[str] = [
     #     "refinement_v2.txt", "few_shot_refinement_v0.txt", "generated_knowledge_v0.txt", "question_answer_v0.txt", "reflective_critic_v0.txt", "rules_v1.txt",
     #     "tree_of_thought_v0.txt", "chain_of_thought_v0.txt", "chain_of_density_v0.txt", "directional_stimulus_v0.txt"
@@ -1,8 +1,37 @@
 from abc import ABC, abstractmethod
+import hashlib
+import threading
 import time
 import random
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
 
 from util.json_utils import is_valid_json
+from util import telemetry
+from util import tokens
+
+
+@dataclass
+class CallState:
+    """Usage and error details accumulated over the attempts of a single call."""
+
+    attempts: int = 0
+    errors: int = 0
+    error_class: Optional[str] = None
+    time_to_first_token: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
+    max_output_tokens: Optional[int] = None  # Output limit planned for this call
+    truncated: bool = False  # The last attempt stopped at the output limit
+
+
+# Provider stop reasons for output cut off at the limit (OpenAI-style "length",
+# Anthropic "max_tokens", Gemini FinishReason.MAX_TOKENS)
+TRUNCATION_REASONS = ("length", "max_tokens")
+
 
 class BaseModel(ABC):
     def __init__(
@@ -12,12 +41,15 @@ class BaseModel(ABC):
         system_prompt: str = "You are a helpful assistant.",
         max_retries: int = 10,
         retry_delay: float = 0.2,
+        retry_jitter: float = 1.0,
     ):
         self._model_name = model_name
         self._temperature = temperature
         self._system_prompt = system_prompt
         self._max_retries = max_retries
         self._retry_delay = retry_delay
+        self._retry_jitter = retry_jitter
+        self._local = threading.local()  # Per-thread CallState and system prompt
 
     @property
     def model_name(self) -> str:
@@ -39,7 +71,8 @@ class BaseModel(ABC):
 
     @property
     def system_prompt(self) -> str:
-        return self._system_prompt
+        # A prompt passed to query_with_retry applies to that call's thread only
+        return getattr(self._local, "system_prompt", None) or self._system_prompt
 
     @system_prompt.setter
     def system_prompt(self, value: str):
@@ -47,30 +80,204 @@ class BaseModel(ABC):
             raise ValueError("System prompt cannot be empty.")
         self._system_prompt = value
 
-    def query_with_retry(self, prompt: str) -> str:
+    @property
+    def provider(self) -> str:
+        return type(self).__name__
+
+    def served_by(self) -> Optional[str]:
+        """The endpoint that answered the last call on this thread."""
+        return f"{self.provider}:{self.model_name}"
+
+    def call_state(self) -> CallState:
+        """The usage recorded so far for the current call on this thread."""
+        state = getattr(self._local, "state", None)
+        if state is None:
+            state = self._local.state = CallState()
+        return state
+
+    @contextmanager
+    def _call_system_prompt(self, system_prompt: Optional[str]):
+        """Use `system_prompt` for the calls made on this thread inside the block."""
+        previous = getattr(self._local, "system_prompt", None)
+        self._local.system_prompt = system_prompt or previous
+        try:
+            yield
+        finally:
+            self._local.system_prompt = previous
+
+    def reset_call_state(self) -> CallState:
+        self._local.state = CallState()
+        return self._local.state
+
+    def _record_usage(
+        self,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cached_tokens: int = 0,
+        reasoning_tokens: int = 0,
+        time_to_first_token: Optional[float] = None,
+    ):
+        """
+        Add token usage reported by the provider SDK to the current call.
+
+        Output tokens are the billed output (including reasoning tokens) and cached
+        tokens are the part of the input served from the provider's prompt cache.
+        """
+        state = self.call_state()
+        state.input_tokens += input_tokens or 0
+        state.output_tokens += output_tokens or 0
+        state.cached_tokens += cached_tokens or 0
+        state.reasoning_tokens += reasoning_tokens or 0
+        if time_to_first_token is not None and state.time_to_first_token is None:
+            state.time_to_first_token = time_to_first_token
+
+    def _record_openai_usage(self, usage):
+        """Record a usage object in the OpenAI chat completions shape."""
+        if usage is None:
+            return
+        prompt_details = getattr(usage, "prompt_tokens_details", None)
+        completion_details = getattr(usage, "completion_tokens_details", None)
+        self._record_usage(
+            input_tokens=getattr(usage, "prompt_tokens", 0),
+            output_tokens=getattr(usage, "completion_tokens", 0),
+            cached_tokens=getattr(prompt_details, "cached_tokens", 0)
+            or getattr(usage, "prompt_cache_hit_tokens", 0),  # DeepSeek
+            reasoning_tokens=getattr(completion_details, "reasoning_tokens", 0),
+        )
+
+    def _max_output_tokens(self, default: Optional[int] = None) -> Optional[int]:
+        """Output limit planned for the current call, for the adapter's request."""
+        return self.call_state().max_output_tokens or default
+
+    def _record_finish_reason(self, reason):
+        """Note the provider's stop reason for the current attempt."""
+        name = getattr(reason, "name", reason)  # Enum members, e.g. Gemini's
+        if name is not None and str(name).lower() in TRUNCATION_REASONS:
+            self.call_state().truncated = True
+
+    def _record_error(self, error: Exception):
+        state = self.call_state()
+        state.errors += 1
+        state.error_class = type(error).__name__
+
+    def query_with_retry(self, prompt: str, system_prompt: Optional[str] = None) -> str:
         """
         Query the model with retry logic for handling temporary failures.
 
+        Every call is reported to the telemetry sinks with its attempts, latency,
+        token usage and last error. Calls are sized with util.tokens first: the
+        output limit for the call is set in call_state().max_output_tokens, prompts
+        that do not fit the context window are refused, and the run budget (if
+        any) is charged. An answer cut off at the output limit is retried once with
+        a larger limit and is not retried after that.
+
         Args:
             prompt (str): The input prompt to send to the model.
+            system_prompt (str): System prompt for this call only, instead of the
+                model's. The instance, which other threads may share, is unchanged.
 
         Returns:
-            str: The model's response to the prompt, or None if all retries failed.
+            str: The model's response to the prompt, or None if all retries failed
+                or the prompt was refused.
+
+        Raises:
+            BudgetExceeded: If the call would exceed the run's TokenBudget.
         """
         if not prompt:
             raise ValueError("Prompt cannot be empty.")
+        with self._call_system_prompt(system_prompt):
+            return self._query_with_retry(prompt)
+
+    def _query_with_retry(self, prompt: str) -> str:
 
+        state = self.reset_call_state()
+        start = time.perf_counter()
+        response = None
+        budget, reservation = tokens.get_budget(), None
+        try:
+            # Size the call before paying for it: refuse prompts that cannot fit and
+            # cap the output at what the expected answer needs
+            try:
+                plan = tokens.plan_call(
+                    self.provider, self.model_name, self.system_prompt, prompt
+                )
+            except tokens.PromptTooLong as e:
+                state.error_class = type(e).__name__
+                print(f"Refusing call to {self.model_name}: {e}")
+                return None
+            state.max_output_tokens = plan.max_output_tokens
+            if budget is not None:
+                reservation = budget.reserve(self.model_name, plan)
+
+            response = self._retry_loop(prompt, state)
+            return response
+        finally:
+            if reservation is not None:
+                budget.settle(
+                    reservation,
+                    self.model_name,
+                    state.input_tokens,
+                    state.output_tokens,
+                    state.cached_tokens,
+                )
+            telemetry.emit(
+                telemetry.CallRecord(
+                    provider=self.provider,
+                    model_name=self.model_name,
+                    prompt_hash=hashlib.sha256(
+                        (self.system_prompt + prompt).encode("utf-8")
+                    ).hexdigest()[:16],
+                    attempts=state.attempts,
+                    success=response is not None,
+                    error_class=state.error_class,
+                    latency=time.perf_counter() - start,
+                    time_to_first_token=state.time_to_first_token,
+                    input_tokens=state.input_tokens,
+                    output_tokens=state.output_tokens,
+                    cached_tokens=state.cached_tokens,
+                    reasoning_tokens=state.reasoning_tokens,
+                )
+            )
+
+    def _retry_loop(self, prompt: str, state: CallState) -> str:
+        raised_limit = False
         for attempt in range(self._max_retries):
+            state.attempts += 1
+            state.truncated = False
+            errors_before = state.errors
             try:
                 response = self.query(prompt)
                 if response and is_valid_json(response):
                     return response
+                elif state.truncated:
+                    # The same limit would cut the answer off again: retry once with
+                    # a larger one, then give up instead of paying for more attempts
+                    state.error_class = "MaxTokens"
+                    limit = state.max_output_tokens
+                    larger = tokens.raised_output_limit(self.model_name, limit)
+                    if raised_limit or not limit or larger <= limit:
+                        print(
+                            f"Non-retryable error for {self.model_name}: output truncated at the output limit."
+                        )
+                        return None
+                    raised_limit = True
+                    state.max_output_tokens = larger
+                    print(
+                        f"Attempt {attempt + 1} for {self.model_name} hit the {limit}-token output limit, retrying with {larger}."
+                    )
+                    continue
                 else:
                     # Treat None or invalid JSON as retryable error
+                    if response or state.errors == errors_before:
+                        # Adapters that swallow exceptions have already recorded them
+                        state.error_class = (
+                            "InvalidJSON" if response else "EmptyResponse"
+                        )
                     print(
                         f"Attempt {attempt + 1} failed for {self.model_name}: Invalid or empty response."
                     )
             except Exception as e:
+                self._record_error(e)
                 error_msg = str(e).upper()
                 non_retryable_errors = [
                     "MAX_TOKENS",
@@ -105,7 +312,7 @@ class BaseModel(ABC):
                     return None
 
             # Exponential backoff + jitter
-            delay = self._retry_delay * (2**attempt) + random.uniform(0, 1)
+            delay = self._retry_delay * (2**attempt) + random.uniform(0, self._retry_jitter)
             time.sleep(delay)
             continue
 
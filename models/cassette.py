@@ -0,0 +1,227 @@
+from models.base_model import BaseModel
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Modes: "record" always calls the wrapped model and appends to the cassette,
+# "replay" never touches the network, "auto" replays hits and records misses.
+MODES = ("record", "replay", "auto")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no recorded response matches the request."""
+
+
+def request_key(
+    model_name: str, system_prompt: str, temperature: float, prompt: str
+) -> str:
+    """Stable hash identifying a request, independent of the provider adapter."""
+    payload = json.dumps(
+        [model_name, system_prompt, float(temperature), prompt], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette(BaseModel):
+    """
+    Deterministic record/replay wrapper around any BaseModel.
+
+    Every call to `query` (including the failed attempts made by `query_with_retry`)
+    is stored as one JSON line with its response, error and wall-clock latency.
+    In replay mode the recorded attempts for a request are served back in the
+    order they were recorded, optionally sleeping for the recorded latency.
+
+    Args:
+        model (BaseModel): The live model to wrap. Not needed in replay mode.
+        path (str): JSONL cassette file.
+        mode (str): One of "record", "replay" or "auto".
+        replay_latency (bool): Sleep for the recorded latency when replaying.
+        latency_scale (float): Factor applied to the recorded latency.
+        max_retries (int): Attempts per call; defaults to the wrapped model's.
+        retry_delay (float): Base backoff between attempts. Defaults to 0 in replay
+            mode, so recorded failed attempts replay without sleeping, and to the
+            wrapped model's delay otherwise.
+        retry_jitter (float): Random extra backoff, with the same defaults.
+    """
+
+    def __init__(
+        self,
+        model: Optional[BaseModel] = None,
+        path: Optional[str] = None,
+        mode: str = "replay",
+        replay_latency: bool = False,
+        latency_scale: float = 1.0,
+        model_name: Optional[str] = None,
+        temperature: Optional[float] = None,
+        system_prompt: Optional[str] = None,
+        max_retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+        retry_jitter: Optional[float] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {MODES}.")
+        if model is None and mode != "replay":
+            raise ValueError("A live model is required to record a cassette.")
+        if model is None and model_name is None:
+            raise ValueError("Replaying without a live model requires a model name.")
+
+        if model is not None:
+            model_name = model_name or model.model_name
+            temperature = model.temperature if temperature is None else temperature
+            system_prompt = system_prompt or model.system_prompt
+        defaults = dict(
+            zip(
+                ("max_retries", "retry_delay", "retry_jitter"),
+                BaseModel.__init__.__defaults__[2:],
+            )
+        )
+        if model is not None:
+            defaults.update(
+                max_retries=model._max_retries,
+                retry_delay=model._retry_delay,
+                retry_jitter=model._retry_jitter,
+            )
+        if mode == "replay":
+            defaults.update(retry_delay=0.0, retry_jitter=0.0)
+        super().__init__(
+            model_name,
+            temperature or 0,
+            system_prompt or BaseModel.__init__.__defaults__[1],
+            max_retries=defaults["max_retries"] if max_retries is None else max_retries,
+            retry_delay=defaults["retry_delay"] if retry_delay is None else retry_delay,
+            retry_jitter=defaults["retry_jitter"] if retry_jitter is None else retry_jitter,
+        )
+        self._model = model
+        self._mode = mode
+        self._replay_latency = replay_latency
+        self._latency_scale = latency_scale
+        self._path = path or os.path.join(
+            "cassettes", f"{self.model_name.replace('/', '_')}.jsonl"
+        )
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[dict]] = {}
+        self._cursors: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    @property
+    def provider(self) -> str:
+        return f"Cassette[{self._model.provider}]" if self._model else "Cassette"
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        with open(self._path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+
+    def _append(self, entry: dict):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        with open(self._path, "a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._entries.setdefault(entry["key"], []).append(entry)
+
+    def _next_recorded(self, key: str) -> Optional[dict]:
+        entries = self._entries.get(key)
+        if not entries:
+            return None
+        # Cycle through repeated recordings so retries replay in the same order
+        cursor = self._cursors.get(key, 0)
+        self._cursors[key] = cursor + 1
+        return entries[cursor % len(entries)]
+
+    def _serve(self, entry: dict) -> str:
+        if self._replay_latency:
+            time.sleep(entry["latency"] * self._latency_scale)
+        self._record_usage(**entry.get("usage", {}))
+        self._record_finish_reason(entry.get("finish_reason"))
+        if entry.get("error"):
+            raise RuntimeError(entry["error"])
+        return entry["response"]
+
+    def _record(self, key: str, prompt: str) -> str:
+        # Keep the wrapped model in sync with settings changed on the cassette; the
+        # system prompt may be this call's own, so it is passed for this thread only
+        self._model.temperature = self.temperature
+
+        start = time.perf_counter()
+        response, error = None, None
+        # Pass on the output limit planned for this call
+        self._model.reset_call_state().max_output_tokens = self._max_output_tokens()
+        try:
+            with self._model._call_system_prompt(self.system_prompt):
+                response = self._model.query(prompt)
+        except Exception as e:
+            error = str(e)
+        latency = time.perf_counter() - start
+
+        inner = self._model.call_state()
+        usage = {
+            "input_tokens": inner.input_tokens,
+            "output_tokens": inner.output_tokens,
+            "cached_tokens": inner.cached_tokens,
+            "reasoning_tokens": inner.reasoning_tokens,
+            "time_to_first_token": inner.time_to_first_token,
+        }
+        self._record_usage(**usage)
+        finish_reason = "length" if inner.truncated else None
+        self._record_finish_reason(finish_reason)
+        if inner.errors:
+            self.call_state().errors += inner.errors
+            self.call_state().error_class = inner.error_class
+
+        with self._lock:
+            self._append(
+                {
+                    "key": key,
+                    "model_name": self.model_name,
+                    "temperature": self.temperature,
+                    "prompt": prompt,
+                    "response": response,
+                    "error": error,
+                    "latency": latency,
+                    "usage": usage,
+                    "finish_reason": finish_reason,
+                    "recorded_at": time.time(),
+                }
+            )
+        if error:
+            raise RuntimeError(error)
+        return response
+
+    def query(self, prompt: str) -> str:
+        if not prompt:
+            raise ValueError("Prompt cannot be empty.")
+        key = request_key(self.model_name, self.system_prompt, self.temperature, prompt)
+
+        if self._mode != "record":
+            with self._lock:
+                entry = self._next_recorded(key)
+                if entry is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if entry is not None:
+                return self._serve(entry)
+            if self._mode == "replay":
+                raise CassetteMiss(
+                    f"No recorded response for {self.model_name} in {self._path}"
+                )
+
+        return self._record(key, prompt)
@@ -36,11 +36,21 @@ class Claude(BaseModel):
         try:
             response = self.client.messages.create(
                 model=self.model_name,  # Use the configured model name
-                max_tokens=4000,  # Add required max_tokens parameter
+                max_tokens=self._max_output_tokens(default=4000),
                 temperature=self.temperature,
                 system=self.system_prompt,
                 messages=[{"role": "user", "content": prompt}],
             )
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+                self._record_usage(
+                    # Anthropic reports cache reads separately from input_tokens
+                    input_tokens=(getattr(usage, "input_tokens", 0) or 0) + cache_read,
+                    output_tokens=getattr(usage, "output_tokens", 0),
+                    cached_tokens=cache_read,
+                )
+            self._record_finish_reason(getattr(response, "stop_reason", None))
             if hasattr(response, "content"):
                 if isinstance(response.content, list):
                     return "".join(
@@ -52,5 +62,6 @@ class Claude(BaseModel):
                     return str(response.content)
             return None
         except Exception as e:
+            self._record_error(e)
             print(f"An error occurred: {e}")
             return None
@@ -33,10 +33,14 @@ class DeepSeek(BaseModel):
                     {"role": "user", "content": prompt}
                 ],
                 temperature=self.temperature,
+                max_tokens=self._max_output_tokens(),
                 stream=False
             )
+            self._record_openai_usage(getattr(response, "usage", None))
+            self._record_finish_reason(response.choices[0].finish_reason)
             return response.choices[0].message.content
         except Exception as e:
+            self._record_error(e)
             print(f"An error occurred: {e}")
             return None
     
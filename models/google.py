@@ -53,9 +53,23 @@ class Google(BaseModel):
                 config=types.GenerateContentConfig(
                     system_instruction=self.system_prompt,
                     temperature=self.temperature,
+                    max_output_tokens=self._max_output_tokens(),
                 ),
                 contents=prompt,
             )
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                thoughts = getattr(usage, "thoughts_token_count", 0) or 0
+                self._record_usage(
+                    input_tokens=getattr(usage, "prompt_token_count", 0),
+                    # Thinking tokens are billed as output but reported separately
+                    output_tokens=(getattr(usage, "candidates_token_count", 0) or 0)
+                    + thoughts,
+                    cached_tokens=getattr(usage, "cached_content_token_count", 0),
+                    reasoning_tokens=thoughts,
+                )
+            if response.candidates:
+                self._record_finish_reason(response.candidates[0].finish_reason)
             content = response.candidates[0].content if response.candidates else None
             # If content is an object, extract its text attribute
             if content:
@@ -84,5 +98,6 @@ class Google(BaseModel):
             return None
 
         except Exception as e:
+            self._record_error(e)
             print(f"An error occurred: {e}")
             return None
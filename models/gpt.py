@@ -33,10 +33,15 @@ class GPT(BaseModel):
                     {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=self.temperature
+                temperature=self.temperature,
+                # Includes reasoning tokens; the plan adds an allowance for them
+                max_completion_tokens=self._max_output_tokens(),
             )
+            self._record_openai_usage(getattr(response, "usage", None))
+            self._record_finish_reason(response.choices[0].finish_reason)
             return response.choices[0].message.content
         except Exception as e:
+            self._record_error(e)
             print(f"An error occurred: {e}")
             return None
 
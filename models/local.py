@@ -0,0 +1,232 @@
+from models.base_model import BaseModel
+
+from openai import OpenAI
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from util import tokens
+
+load_dotenv()
+# Local servers usually run without authentication; the client needs some key
+API_KEY = os.getenv("LOCAL_API_KEY", "not-needed")
+BASE_URL = os.getenv("LOCAL_BASE_URL", "http://127.0.0.1:8080/v1")
+
+# Prompt formats for the raw /completions endpoint, used when batching. They start
+# without a BOS token: llama.cpp and vLLM add it when tokenizing the prompt.
+CHAT_TEMPLATES = {
+    "gemma": (
+        "<start_of_turn>user\n{system}\n\n{prompt}<end_of_turn>\n<start_of_turn>model\n"
+    ),
+    "llama": (
+        "<|start_header_id|>system<|end_header_id|>\n\n{system}<|eot_id|>"
+        "<|start_header_id|>user<|end_header_id|>\n\n{prompt}<|eot_id|>"
+        "<|start_header_id|>assistant<|end_header_id|>\n\n"
+    ),
+    "chatml": (
+        "<|im_start|>system\n{system}<|im_end|>\n<|im_start|>user\n{prompt}<|im_end|>\n"
+        "<|im_start|>assistant\n"
+    ),
+}
+
+
+def _template_for(model_name: str) -> str:
+    name = model_name.lower()
+    if "gemma" in name:
+        return CHAT_TEMPLATES["gemma"]
+    if "llama" in name:
+        return CHAT_TEMPLATES["llama"]
+    return CHAT_TEMPLATES["chatml"]
+
+
+class Local(BaseModel):
+    """
+    OpenAI-compatible local inference server (llama.cpp server, vLLM, or the
+    stand-in in benchmarks/bench_local.py), e.g. for gemma-3-270m or gemma-3-4b on CPU.
+
+    With `max_batch_size` > 1, concurrent `query` calls from different threads are
+    coalesced: a background thread collects calls for up to `batch_window` seconds
+    (or until the batch is full) and sends them as one /completions request with a
+    list of prompts, formatted with the model's chat template. Servers that do not
+    accept prompt lists should be used with `max_batch_size=1`, which sends plain
+    /chat/completions requests.
+
+    Larger batches raise throughput on CPU servers until the matrix kernels are
+    saturated, at the price of per-call latency; see `batch_stats` and
+    benchmarks/bench_local.py.
+
+    Args:
+        base_url (str): Server URL, defaults to $LOCAL_BASE_URL or http://127.0.0.1:8080/v1.
+        max_batch_size (int): Most calls per request.
+        batch_window (float): Seconds to wait for more calls after the first one.
+        chat_template (str): Prompt format with {system} and {prompt} placeholders,
+            picked from the model name if not given.
+        timeout (float): Request timeout in seconds; CPU batches can be slow.
+        result_timeout (float): Longest a call waits for its batch, including the
+            batches queued before it. Defaults to twice the request timeout.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "gemma-3-270m",
+        temperature: float = 0,
+        system_prompt: str = BaseModel.__init__.__defaults__[1],
+        base_url: Optional[str] = None,
+        max_batch_size: int = 8,
+        batch_window: float = 0.02,
+        chat_template: Optional[str] = None,
+        timeout: float = 600.0,
+        result_timeout: Optional[float] = None,
+    ):
+        super().__init__(model_name, temperature, system_prompt)
+        self.client = OpenAI(api_key=API_KEY, base_url=base_url or BASE_URL, timeout=timeout)
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.chat_template = chat_template or _template_for(model_name)
+        self.result_timeout = result_timeout or 2 * timeout + batch_window
+
+        self._pending: "queue.Queue[Tuple[str, Optional[int], Future]]" = queue.Queue()
+        self._batcher: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.batch_sizes: Dict[int, int] = {}
+        self.batch_seconds = 0.0
+
+    def batch_stats(self) -> dict:
+        with self._stats_lock:
+            batches = sum(self.batch_sizes.values())
+            calls = sum(size * n for size, n in self.batch_sizes.items())
+            return {
+                "batches": batches,
+                "calls": calls,
+                "mean_batch_size": calls / batches if batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "calls_per_server_second": calls / self.batch_seconds
+                if self.batch_seconds
+                else 0.0,
+            }
+
+    def query(self, prompt: str) -> str:
+        if not prompt:
+            raise ValueError("Prompt cannot be empty.")
+        try:
+            if self.max_batch_size <= 1:
+                return self._query_single(prompt)
+
+            future: Future = Future()
+            self._ensure_batcher()
+            # Formatted here: the system prompt may be this thread's per-call prompt
+            text = self.chat_template.format(system=self.system_prompt, prompt=prompt)
+            self._pending.put((text, self._max_output_tokens(), future))
+            try:
+                text, input_tokens, output_tokens, finish_reason = future.result(
+                    timeout=self.result_timeout
+                )
+            except FutureTimeout:
+                future.cancel()  # The batcher skips it if not yet sent
+                raise TimeoutError(
+                    f"No batch result after {self.result_timeout:g}s (TIMEOUT)"
+                )
+            # Usage is recorded on the calling thread, where call_state() lives
+            self._record_usage(input_tokens=input_tokens, output_tokens=output_tokens)
+            self._record_finish_reason(finish_reason)
+            return text
+        except Exception as e:
+            self._record_error(e)
+            print(f"An error occurred: {e}")
+            return None
+
+    def _query_single(self, prompt: str) -> str:
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=self.temperature,
+            max_tokens=self._max_output_tokens(),
+        )
+        self._count_batch(1, time.perf_counter() - start)
+        self._record_openai_usage(getattr(response, "usage", None))
+        self._record_finish_reason(response.choices[0].finish_reason)
+        return response.choices[0].message.content
+
+    def _ensure_batcher(self):
+        with self._stats_lock:
+            if self._batcher is None or not self._batcher.is_alive():
+                self._batcher = threading.Thread(
+                    target=self._batch_loop, name=f"{self.model_name}-batcher", daemon=True
+                )
+                self._batcher.start()
+
+    def _count_batch(self, size: int, seconds: float):
+        with self._stats_lock:
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            self.batch_seconds += seconds
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._send_batch(batch)
+
+    def _send_batch(self, batch: List[Tuple[str, Optional[int], Future]]):
+        # Calls that timed out and cancelled their future are not sent
+        batch = [call for call in batch if call[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        error: Exception = RuntimeError("Batch ended without a result for this call.")
+        try:
+            prompts = [text for text, _, _ in batch]
+            limits = [limit for _, limit, _ in batch if limit]
+            start = time.perf_counter()
+            response = self.client.completions.create(
+                model=self.model_name,
+                prompt=prompts,
+                temperature=self.temperature,
+                max_tokens=max(limits) if limits else None,
+            )
+            self._count_batch(len(batch), time.perf_counter() - start)
+
+            choices = {}
+            for choice in response.choices or []:
+                if isinstance(choice.index, int) and 0 <= choice.index < len(batch):
+                    choices[choice.index] = choice
+            for i, (full_prompt, (_, _, future)) in enumerate(zip(prompts, batch)):
+                choice = choices.get(i)
+                if choice is None:
+                    future.set_exception(
+                        RuntimeError(f"No choice for prompt {i} of a batch of {len(batch)}.")
+                    )
+                    continue
+                # Usage is only reported per request; split it by estimated size
+                future.set_result(
+                    (
+                        choice.text,
+                        tokens.count_tokens(full_prompt, self.provider, self.model_name),
+                        tokens.count_tokens(choice.text or "", self.provider, self.model_name),
+                        choice.finish_reason,
+                    )
+                )
+        except Exception as e:
+            error = e
+        finally:
+            # Every caller is blocked on its future: never leave one unresolved
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
@@ -36,9 +36,12 @@ class MistralModel(BaseModel):
                     {"role": "user", "content": prompt},
                 ],
                 temperature=self.temperature,
+                max_tokens=self._max_output_tokens(),
             )
+            self._record_openai_usage(getattr(response, "usage", None))
             if not response.choices:
                 raise ValueError("No choices returned in the response.")
+            self._record_finish_reason(response.choices[0].finish_reason)
 
             # Extract content from the message
             message_content = response.choices[0].message.content
@@ -60,5 +63,6 @@ class MistralModel(BaseModel):
 
             return content
         except Exception as e:
+            self._record_error(e)
             print(f"An error occurred: {e}")
             return None
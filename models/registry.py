@@ -0,0 +1,34 @@
+from models.base_model import BaseModel
+
+import importlib
+
+# Provider name -> (module, class). Adapters are imported lazily because each one
+# requires its API key at import time.
+PROVIDERS = {
+    "GPT": ("models.gpt", "GPT"),
+    "Claude": ("models.claude", "Claude"),
+    "Google": ("models.google", "Google"),
+    "DeepSeek": ("models.deepseek", "DeepSeek"),
+    "Grok": ("models.grok", "Grok"),
+    "Mistral": ("models.mistral", "MistralModel"),
+    "Qwen": ("models.qwen", "Qwen"),
+    "Together": ("models.together", "Together"),
+    "Simulated": ("models.simulated", "SimulatedModel"),
+    "Local": ("models.local", "Local"),
+}
+
+
+def create(provider: str, **kwargs) -> BaseModel:
+    """
+    Create a model by provider name, e.g. create("GPT", model_name="gpt-5").
+
+    Raises:
+        ValueError: If the provider is unknown.
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(
+            f"Unknown provider '{provider}'. Available: {', '.join(PROVIDERS)}"
+        )
+    module_name, class_name = PROVIDERS[provider]
+    model_class = getattr(importlib.import_module(module_name), class_name)
+    return model_class(**kwargs)
@@ -0,0 +1,309 @@
+from models.base_model import BaseModel, CallState
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from util.pricing import PRICES
+
+# Logical model -> endpoints serving the same weights, as registry specs. Entries
+# are tried in the order the router ranks them, not in the order listed. Endpoints
+# whose model is not in util.pricing.PRICES need "price_in"/"price_out" here;
+# otherwise they are ranked after every priced endpoint.
+ROUTES: Dict[str, List[dict]] = {
+    "gpt-oss-120b": [
+        {"provider": "Together", "model_name": "openai/gpt-oss-120b"},
+    ],
+    "gemma-3-27b": [
+        {"provider": "Google", "model_name": "gemma-3-27b"},
+        {"provider": "Together", "model_name": "google/gemma-3-27b-it"},
+    ],
+    "deepseek-v3": [
+        {"provider": "DeepSeek", "model_name": "deepseek-chat"},
+        {"provider": "Together", "model_name": "deepseek-ai/DeepSeek-V3"},
+    ],
+    "llama-4-maverick": [
+        {
+            "provider": "Together",
+            "model_name": "meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8",
+        },
+    ],
+}
+
+
+@dataclass
+class Endpoint:
+    """
+    One way of reaching a model, with its observed health.
+
+    Latency, error rate and tokens per call are exponentially weighted moving
+    averages over completed calls (`query_with_retry`, retries included).
+    """
+
+    name: str
+    model: BaseModel
+    price_in: Optional[float] = None  # USD per 1M input tokens, None if unknown
+    price_out: Optional[float] = None  # USD per 1M output tokens, None if unknown
+    latency: Optional[float] = None
+    error_rate: float = 0.0
+    input_tokens: Optional[float] = None
+    output_tokens: Optional[float] = None
+    calls: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    open_until: float = 0.0  # Circuit breaker: skipped until this time
+    in_flight: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        prices = PRICES.get(self.model.model_name)
+        if prices and self.price_in is None:
+            self.price_in = prices[0]
+        if prices and self.price_out is None:
+            self.price_out = prices[1]
+
+    @property
+    def priced(self) -> bool:
+        return self.price_in is not None and self.price_out is not None
+
+    def cost_per_call(self) -> Optional[float]:
+        if not self.priced:
+            return None
+        if self.input_tokens is None:
+            # Not observed yet; assume a typical scoring call
+            return (2_000 * self.price_in + 1_000 * self.price_out) / 1_000_000
+        return (
+            self.input_tokens * self.price_in + self.output_tokens * self.price_out
+        ) / 1_000_000
+
+    def summary(self) -> dict:
+        return {
+            "endpoint": self.name,
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency_s": self.latency,
+            "error_rate": self.error_rate,
+            "cost_per_call": self.cost_per_call(),
+            "open": self.open_until > time.monotonic(),
+        }
+
+
+class RoutedModel(BaseModel):
+    """
+    A logical model served by several equivalent endpoints.
+
+    Each call goes to the endpoint with the lowest expected cost of a successful
+    answer:
+        (latency + cost_per_call / usd_per_second) / (1 - error_rate)
+    Endpoints that have not answered yet are tried first, and endpoints without a
+    known price are ranked after all priced ones (an unknown price is not free).
+    Prompts an endpoint refuses as too long for its context window fail over
+    without counting against the endpoint's health. If the chosen endpoint
+    fails (its own retries exhausted), the call fails over to the next one. After
+    `failure_threshold` consecutive failures an endpoint is skipped for
+    `cooldown` seconds and then given one trial call.
+
+    Args:
+        model_name (str): The logical model name results are reported under.
+        endpoints (List[Endpoint]): The endpoints, e.g. from `from_routes`.
+        usd_per_second (float): How much one second of latency is worth in USD
+            (0.001 trades one second for a tenth of a cent).
+        alpha (float): Weight of the newest observation in the moving averages.
+        failure_threshold (int): Consecutive failures that open the circuit.
+        cooldown (float): Seconds an open endpoint is skipped.
+        max_retries_per_endpoint (int): Retries on one endpoint before failing over.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        endpoints: List[Endpoint],
+        temperature: float = 0,
+        system_prompt: str = BaseModel.__init__.__defaults__[1],
+        usd_per_second: float = 0.001,
+        alpha: float = 0.2,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_retries_per_endpoint: Optional[int] = 3,
+    ):
+        if not endpoints:
+            raise ValueError("A routed model needs at least one endpoint.")
+        self._endpoints = endpoints
+        if max_retries_per_endpoint is not None:
+            for endpoint in endpoints:
+                endpoint.model._max_retries = max_retries_per_endpoint
+        super().__init__(model_name, temperature, system_prompt)
+        # Push the shared settings to every endpoint
+        self.temperature = temperature
+        self.system_prompt = system_prompt
+        self._usd_per_second = usd_per_second
+        self._alpha = alpha
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+
+    @classmethod
+    def from_routes(
+        cls,
+        model_name: str,
+        specs: Optional[List[dict]] = None,
+        temperature: float = 0,
+        system_prompt: str = BaseModel.__init__.__defaults__[1],
+        **kwargs,
+    ) -> "RoutedModel":
+        """
+        Build a routed model from registry specs, by default the ones in ROUTES.
+
+        A spec is {"provider": ..., "model_name": ..., **adapter kwargs}, with
+        optional "name", "price_in" and "price_out" keys for the endpoint.
+        """
+        from models import registry
+
+        endpoints = []
+        for spec in specs if specs is not None else ROUTES[model_name]:
+            spec = dict(spec)
+            provider = spec.pop("provider")
+            name = spec.pop("name", f"{provider}:{spec.get('model_name', provider)}")
+            price_in, price_out = spec.pop("price_in", None), spec.pop("price_out", None)
+            endpoints.append(
+                Endpoint(
+                    name,
+                    registry.create(
+                        provider,
+                        temperature=temperature,
+                        system_prompt=system_prompt,
+                        **spec,
+                    ),
+                    price_in,
+                    price_out,
+                )
+            )
+        return cls(model_name, endpoints, temperature, system_prompt, **kwargs)
+
+    @property
+    def provider(self) -> str:
+        return "Router"
+
+    @property
+    def endpoints(self) -> List[Endpoint]:
+        return self._endpoints
+
+    @BaseModel.temperature.setter
+    def temperature(self, value: float):
+        if not (0.0 <= value <= 2.0):
+            raise ValueError("Temperature must be between 0.0 and 2.0")
+        for endpoint in self._endpoints:
+            endpoint.model.temperature = value
+        self._temperature = value
+
+    @BaseModel.system_prompt.setter
+    def system_prompt(self, value: str):
+        if not value:
+            raise ValueError("System prompt cannot be empty.")
+        for endpoint in self._endpoints:
+            endpoint.model.system_prompt = value
+        self._system_prompt = value
+
+    def served_by(self) -> Optional[str]:
+        return getattr(self._local, "endpoint", None)
+
+    def _expected_cost(self, endpoint: Endpoint) -> float:
+        if endpoint.latency is None:
+            # Explore endpoints without observations first; never-successful ones last
+            return -1.0 if endpoint.calls == 0 else float("inf")
+        cost = endpoint.cost_per_call() or 0.0  # Unpriced endpoints rank last anyway
+        expected = endpoint.latency + cost / self._usd_per_second
+        return expected / max(0.05, 1.0 - endpoint.error_rate)
+
+    def ranked(self) -> List[Endpoint]:
+        """Endpoints in the order a call would try them."""
+        now = time.monotonic()
+        closed = [e for e in self._endpoints if e.open_until <= now]
+        open_ = sorted(
+            (e for e in self._endpoints if e.open_until > now),
+            key=lambda e: e.open_until,
+        )
+        # Spread concurrent calls between equally ranked, unobserved endpoints
+        return (
+            sorted(
+                closed,
+                key=lambda e: (not e.priced, self._expected_cost(e), e.in_flight),
+            )
+            + open_
+        )
+
+    def _observe(self, endpoint: Endpoint, success: bool, latency: float, state: CallState):
+        a = self._alpha
+        with endpoint._lock:
+            endpoint.calls += 1
+            endpoint.error_rate = (1 - a) * endpoint.error_rate + a * (not success)
+            if success:
+                endpoint.consecutive_failures = 0
+                endpoint.open_until = 0.0
+                endpoint.latency = (
+                    latency
+                    if endpoint.latency is None
+                    else (1 - a) * endpoint.latency + a * latency
+                )
+                if state.input_tokens or state.output_tokens:
+                    if endpoint.input_tokens is None:
+                        endpoint.input_tokens = state.input_tokens
+                        endpoint.output_tokens = state.output_tokens
+                    else:
+                        endpoint.input_tokens += a * (state.input_tokens - endpoint.input_tokens)
+                        endpoint.output_tokens += a * (
+                            state.output_tokens - endpoint.output_tokens
+                        )
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self._failure_threshold:
+                    endpoint.open_until = time.monotonic() + self._cooldown
+                    print(
+                        f"Endpoint {endpoint.name} for {self.model_name} failed "
+                        f"{endpoint.consecutive_failures} times in a row, "
+                        f"skipping it for {self._cooldown:g}s"
+                    )
+
+    def query_with_retry(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        """
+        Query the best endpoint, failing over to the others in rank order.
+
+        Each endpoint runs its own retry loop (and telemetry). The usage of the
+        serving endpoint is available through call_state() afterwards.
+        """
+        if not prompt:
+            raise ValueError("Prompt cannot be empty.")
+        self._local.endpoint = None
+        for endpoint in self.ranked():
+            with endpoint._lock:
+                endpoint.in_flight += 1
+            start = time.perf_counter()
+            try:
+                response = endpoint.model.query_with_retry(prompt, system_prompt)
+            finally:
+                with endpoint._lock:
+                    endpoint.in_flight -= 1
+            state = endpoint.model.call_state()
+            self._local.state = state
+            if response is None and state.error_class == "PromptTooLong":
+                # Refused before sending: says nothing about the endpoint's health
+                print(
+                    f"Endpoint {endpoint.name} refused the prompt as too long, failing over"
+                )
+                continue
+            self._observe(endpoint, response is not None, time.perf_counter() - start, state)
+            if response is not None:
+                self._local.endpoint = endpoint.name
+                return response
+            print(f"Endpoint {endpoint.name} failed for {self.model_name}, failing over")
+        return None
+
+    def query(self, prompt: str) -> str:
+        # Single attempt on the best endpoint; query_with_retry handles failover
+        endpoint = self.ranked()[0]
+        self._local.endpoint = endpoint.name
+        return endpoint.model.query(prompt)
+
+    def report(self) -> List[dict]:
+        return [endpoint.summary() for endpoint in self._endpoints]
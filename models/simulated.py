@@ -0,0 +1,199 @@
+from models.base_model import BaseModel
+
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+CRITERIA = [
+    "Unambiguous",
+    "Verifiable",
+    "Feasible",
+    "Complete",
+    "Correct",
+    "Consistent",
+    "Modifiable",
+]
+
+FAULTS = ["rate_limit", "server_error", "timeout", "empty", "truncated", "markdown"]
+
+
+class SimulatedModel(BaseModel):
+    """
+    Offline stand-in for a provider with configurable latency and failure modes.
+
+    Latency is drawn from a log-normal distribution around `latency_median` seconds
+    (multiplied by `time_scale`, so benchmarks can run faster than real time).
+    Faults are injected per call with the given rates:
+        rate_limit / server_error / timeout: raise errors with the messages the
+            provider SDKs produce (429, 5xx, timeout), or return None like the real
+            adapters do when `raise_errors` is False
+        empty: no content returned
+        truncated: JSON cut off mid-generation (as seen with Gemini 2.5 Pro)
+        markdown: valid JSON wrapped in a ```json block with surrounding prose
+
+    Responses follow the mixture_of_opinions output format, with scores derived
+    deterministically from the prompt. Refinement prompts (those asking for a
+    "refined_requirement") also get a deterministic rewritten requirement.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "simulated",
+        temperature: float = 0,
+        system_prompt: str = BaseModel.__init__.__defaults__[1],
+        latency_median: float = 1.5,
+        latency_sigma: float = 0.5,
+        output_tokens_per_second: float = 0.0,
+        time_scale: float = 1.0,
+        timeout_seconds: float = 60.0,
+        fault_rates: Dict[str, float] = None,
+        raise_errors: bool = True,
+        seed: int = 42,
+        max_retries: int = 10,
+        retry_delay: float = 0.2,
+        retry_jitter: float = 1.0,
+    ):
+        super().__init__(
+            model_name,
+            temperature,
+            system_prompt,
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            retry_jitter=retry_jitter,
+        )
+        fault_rates = fault_rates or {}
+        unknown = set(fault_rates) - set(FAULTS)
+        if unknown:
+            raise ValueError(f"Unknown fault types: {sorted(unknown)}")
+        if sum(fault_rates.values()) > 1.0:
+            raise ValueError("Fault rates must sum to at most 1.0")
+
+        self._latency_mu = math.log(latency_median)
+        self._latency_sigma = latency_sigma
+        self._output_tokens_per_second = output_tokens_per_second
+        self._time_scale = time_scale
+        self._timeout_seconds = timeout_seconds
+        self._fault_rates = fault_rates
+        self._raise_errors = raise_errors
+        self._rng = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.requests = 0
+        self.fault_counts: Dict[str, int] = {fault: 0 for fault in FAULTS}
+        self.request_latencies: List[float] = []
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = 0
+            self.requests = 0
+            self.fault_counts = {fault: 0 for fault in FAULTS}
+            self.request_latencies = []
+
+    @property
+    def retries(self) -> int:
+        return self.calls - self.requests
+
+    def query_with_retry(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+        # Time the full retry loop so benchmarks see what a caller sees
+        start = time.perf_counter()
+        try:
+            return super().query_with_retry(prompt, system_prompt)
+        finally:
+            with self._lock:
+                self.requests += 1
+                self.request_latencies.append(time.perf_counter() - start)
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            latency = self._rng.lognormvariate(self._latency_mu, self._latency_sigma)
+            roll = self._rng.random()
+            cut = self._rng.random()
+
+        fault = None
+        for name in FAULTS:
+            rate = self._fault_rates.get(name, 0.0)
+            if roll < rate:
+                fault = name
+                break
+            roll -= rate
+        if fault:
+            with self._lock:
+                self.fault_counts[fault] += 1
+        return latency, fault, cut
+
+    def _response(self, prompt: str) -> str:
+        digest = hashlib.sha256(
+            (self.model_name + self.system_prompt + prompt).encode("utf-8")
+        ).digest()
+        scores = {
+            criterion: {
+                "score": digest[i] * 100 // 255,
+                "justification": f"Simulated assessment of {criterion.lower()}.",
+            }
+            for i, criterion in enumerate(CRITERIA)
+        }
+        overall = round(sum(s["score"] for s in scores.values()) / len(CRITERIA))
+        response = {"consensus_assessment": {"scores": scores}, "overall_score": overall}
+        if "expert_assessments" in self.system_prompt:
+            # Monolithic panel prompts also generate every expert's assessment
+            response = {
+                "expert_assessments": {
+                    f"expert_{i}": {"scores": scores, "overall_score": overall}
+                    for i in range(4)
+                },
+                **response,
+            }
+        if "refined_requirement" in self.system_prompt + prompt:
+            response["refined_requirement"] = (
+                f"The system shall satisfy simulated requirement {digest[:4].hex()}."
+            )
+        return json.dumps(response, indent=2)
+
+    def _fail(self, message: str):
+        if self._raise_errors:
+            raise RuntimeError(message)
+        print(f"An error occurred: {message}")
+        return None
+
+    def query(self, prompt: str) -> str:
+        if not prompt:
+            raise ValueError("Prompt cannot be empty.")
+        latency, fault, cut = self._draw()
+        response = self._response(prompt)
+        first_token = latency
+        if self._output_tokens_per_second:
+            latency += (len(response) / 4) / self._output_tokens_per_second
+
+        if fault == "timeout":
+            time.sleep(self._timeout_seconds * self._time_scale)
+            return self._fail("Request timed out (TIMEOUT)")
+        time.sleep(latency * self._time_scale)
+
+        limit = self._max_output_tokens()
+        if limit and len(response) // 4 > limit:
+            # Generation stops at the output limit, as with finish_reason "length"
+            response = response[: limit * 4]
+            self._record_finish_reason("length")
+        self._record_usage(
+            input_tokens=len(self.system_prompt + prompt) // 4,
+            output_tokens=len(response) // 4,
+            time_to_first_token=first_token * self._time_scale,
+        )
+
+        if fault == "rate_limit":
+            return self._fail("Error code: 429 - RATE LIMIT exceeded")
+        if fault == "server_error":
+            return self._fail("Error code: 503 - Service UNAVAILABLE")
+        if fault == "empty":
+            return None
+        if fault == "truncated":
+            return response[: max(1, int(len(response) * cut))]
+        if fault == "markdown":
+            return f"Here is the assessment:\n```json\n{response}\n```\nLet me know if you need more."
+        return response
@@ -0,0 +1,80 @@
+import json
+
+import pandas as pd
+
+from models.simulated import SimulatedModel
+from util.manifest import IncrementalRun
+from util.scoring import get_prompt
+from util.semantic_cache import ScoreIndex
+
+REQUIREMENTS = pd.DataFrame(
+    {
+        "Requirement": [
+            "The system shall log in.",
+            "The system shall log in.",
+            "The system shall export reports.",
+        ],
+        "Type": ["F", "F", "F"],
+    }
+)
+
+
+class Flaky(SimulatedModel):
+    """Gives no answer for the export requirement while `outage` is set."""
+
+    outage = False
+
+    def query_with_retry(self, prompt, system_prompt=None):
+        if self.outage and "export" in prompt:
+            return None
+        return super().query_with_retry(prompt, system_prompt)
+
+
+def _run(tmp_path, system_prompt, outage=False):
+    model = Flaky(system_prompt=system_prompt, time_scale=0)
+    model.outage = outage
+    run = IncrementalRun(str(tmp_path / "manifest.json"), output_dir=str(tmp_path))
+    merged = run.score(model, REQUIREMENTS)
+    with open(tmp_path / "simulated_scores.json", "r") as f:
+        return run, merged, [row["original_requirement"] for row in json.load(f)]
+
+
+def test_duplicates_keep_their_rows_and_failed_rescores_are_dropped(tmp_path):
+    prompt = get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring")
+    run, merged, rows = _run(tmp_path, prompt)
+    assert rows == list(REQUIREMENTS["Requirement"])
+    assert run.reports[-1].executed == 3
+
+    run, _, rows = _run(tmp_path, prompt)
+    assert run.reports[-1].skipped == 3
+
+    # A new prompt invalidates every row; the one that fails is not kept stale
+    changed = prompt + "\nBe strict."
+    run, _, rows = _run(tmp_path, changed, outage=True)
+    report = run.reports[-1]
+    assert report.prompt_changed == 3 and report.failed == 1 and report.dropped == 1
+    assert rows == ["The system shall log in.", "The system shall log in."]
+    assert len(run.entries) == 1  # One call key for the duplicated requirement
+
+    run, _, rows = _run(tmp_path, changed)
+    assert run.reports[-1].skipped == 2 and run.reports[-1].new == 1
+
+
+def test_reused_scores_are_not_recorded_as_fresh(tmp_path):
+    prompt = get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring")
+    run = IncrementalRun(str(tmp_path / "manifest.json"), output_dir=str(tmp_path))
+    requirements = pd.DataFrame(
+        {
+            "Requirement": ["The system shall log users in.", "The system shall log users in!"],
+            "Type": ["F", "F"],
+        }
+    )
+
+    merged = run.score(
+        Flaky(system_prompt=prompt, time_scale=0),
+        requirements,
+        score_index=ScoreIndex(similarity_threshold=0.5),
+    )
+
+    assert [r.reused_from for r in merged] == [None, "The system shall log users in."]
+    assert len(run.entries) == 1
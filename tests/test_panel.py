@@ -0,0 +1,43 @@
+import glob
+import time
+
+import pandas as pd
+import pytest
+
+from models.simulated import SimulatedModel
+from util.panel import ExpertPanel, split_panel_prompt
+from util.tokens import BudgetExceeded
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob("prompts/scoring/mixture_of_opinions_v*.txt")))
+def test_every_panel_prompt_splits(path):
+    with open(path, "r") as f:
+        experts = split_panel_prompt(f.read())
+    assert len(experts) >= 4
+
+
+class OverBudget(SimulatedModel):
+    def query_with_retry(self, prompt, system_prompt=None):
+        time.sleep(0.2)  # Let the other experts answer first
+        raise BudgetExceeded("Run budget exhausted")
+
+
+def test_failing_expert_does_not_lose_the_panel():
+    with open("prompts/scoring/mixture_of_opinions_v2.txt", "r") as f:
+        experts = split_panel_prompt(f.read())
+    models = {
+        e.key: SimulatedModel(system_prompt=e.system_prompt, time_scale=0) for e in experts
+    }
+    models[experts[0].key] = OverBudget(system_prompt=experts[0].system_prompt, time_scale=0)
+    panel = ExpertPanel(models, quorum=len(experts), threshold=0)
+
+    results = panel.score_all(
+        pd.DataFrame({"Requirement": ["The system shall log in."], "Type": ["F"]}),
+        progress=False,
+    )
+
+    decision = results[0].score_response["panel_decision"]
+    assert decision["failed_experts"] == [experts[0].key]
+    assert decision["decision"] == "fail"
+    assert sorted(decision["aggregated_experts"]) == sorted(e.key for e in experts[1:])
+    assert panel.stats.failed == 1
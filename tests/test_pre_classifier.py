@@ -0,0 +1,32 @@
+import json
+
+import pandas as pd
+
+from util.pre_classifier import PreClassifier, load_quality_data
+
+SCORED = {
+    "The system shall encrypt stored passwords.": 80,
+    "The system shall be fast.": 10,
+    "The system shall be user friendly.": 15,
+    "The system shall log every failed login attempt.": 75,
+}
+
+
+def test_routed_requirements_are_held_out_of_the_prior(tmp_path):
+    with open(tmp_path / "judge_scores.json", "w") as f:
+        json.dump([{"original_requirement": r, "overall_score": s} for r, s in SCORED.items()], f)
+    routed = ["The system shall be fast.", "The system shall encrypt stored passwords."]
+
+    quality_df = load_quality_data(str(tmp_path), exclude=routed)
+    assert set(quality_df["text"]).isdisjoint(routed)
+
+    categories = pd.DataFrame(
+        {"text": list(SCORED) * 2, "category": ["security", "functional"] * 4}
+    )
+    classifier = PreClassifier(quality_threshold=35, margin=0).fit(categories, quality_df)
+    all_scores = load_quality_data(str(tmp_path))
+    report = classifier.routing_report(classifier.route(list(SCORED)), all_scores)
+
+    # Requirements the prior was trained on do not count towards the accuracy
+    assert report["held_out"] == 2
+    assert 0.0 <= report["routing_accuracy"] <= 1.0
@@ -0,0 +1,42 @@
+import pandas as pd
+
+from models.simulated import SimulatedModel
+from util.refinement_loop import RefinementLoop
+from util.scoring import get_prompt
+from util.tokens import BudgetExceeded
+
+
+class FailingChecker(SimulatedModel):
+    """Raises for requirements mentioning a keyword, answers the rest."""
+
+    def query_with_retry(self, prompt, system_prompt=None):
+        if "budget" in prompt:
+            raise BudgetExceeded("Run budget exhausted")
+        if "outage" in prompt:
+            raise ConnectionError("provider down")
+        return super().query_with_retry(prompt, system_prompt)
+
+
+def test_step_errors_stop_only_their_requirement():
+    scoring_prompt = get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring")
+    checker = FailingChecker(system_prompt=scoring_prompt, time_scale=0)
+    refiner = SimulatedModel(time_scale=0)
+    requirements = pd.DataFrame(
+        {
+            "Requirement": [
+                "The system shall log in.",
+                "The system shall respect the budget.",
+                "The system shall survive an outage.",
+            ],
+            "Type": ["F", "F", "F"],
+        }
+    )
+
+    states, report = RefinementLoop(
+        refiner, checker, "{{ REQUIREMENT }}", threshold=101, max_rounds=1
+    ).run(requirements)
+
+    assert [s.stop_reason for s in states][1:] == ["budget", "failed"]
+    assert states[0].rounds and states[0].stop_reason not in ("budget", "failed")
+    assert report["requirements"] == 3
+    assert report["stop_reasons"]["budget"] == report["stop_reasons"]["failed"] == 1
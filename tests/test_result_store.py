@@ -0,0 +1,28 @@
+import json
+
+from util.result_store import FIELDS, ResultTable
+from util.scoring import RequirementResult, write_model_results
+
+
+def _results():
+    return [
+        RequirementResult(
+            "The system shall log in.", "F", "m", {"overall_score": 80, "notes": ["a"]}, 80
+        ),
+        RequirementResult("The UI should be nice.", "NF", "m", {"overall_score": 30}, 30),
+        RequirementResult("Unparsed", "F", "m", None, refined_requirement="x"),
+    ]
+
+
+def test_fields_match_requirement_result():
+    assert FIELDS == list(RequirementResult.__dataclass_fields__)
+
+
+def test_table_round_trips_and_writes_the_same_file(tmp_path):
+    results = _results()
+    table = ResultTable.from_results(results)
+
+    assert table.to_dicts() == [r.__dict__ for r in results]
+    path = write_model_results("m", table, output_dir=str(tmp_path))
+    with open(path) as f:
+        assert f.read() == json.dumps([r.__dict__ for r in results], indent=4)
@@ -0,0 +1,55 @@
+import pytest
+
+from util import tokens
+from util.scoring import get_prompt
+
+# Reasoning models configured in main.py and the grids
+REASONING_MODELS = [
+    ("GPT", "gpt-5"),
+    ("GPT", "gpt-5-mini"),
+    ("GPT", "gpt-5-nano"),
+    ("Google", "gemini-2.5-pro"),
+    ("Google", "gemini-2.5-flash"),
+    ("Google", "gemini-2.5-flash-lite"),
+    ("Together", "openai/gpt-oss-120b"),
+    ("DeepSeek", "deepseek-reasoner"),
+    ("MistralModel", "magistral-medium-latest"),
+]
+
+
+@pytest.mark.parametrize("provider, model_name", REASONING_MODELS)
+def test_reasoning_models_get_thinking_headroom(provider, model_name):
+    system_prompt = get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring")
+    plan = tokens.plan_call(provider, model_name, system_prompt, "The system shall log in.")
+
+    answer = max(
+        tokens.MIN_OUTPUT_TOKENS,
+        int(tokens.expected_output_tokens(system_prompt) * tokens.OUTPUT_HEADROOM),
+    )
+    _, max_output = tokens.model_limits(model_name)
+    assert tokens.is_reasoning_model(model_name)
+    assert plan.max_output_tokens == min(answer + tokens.REASONING_ALLOWANCE, max_output)
+    assert plan.max_output_tokens > answer
+
+
+@pytest.mark.parametrize("prompt_name", ["chain_of_thought_v0.txt", "tree_of_thought_v0.txt"])
+def test_prose_before_json_is_counted(prompt_name):
+    prompt = get_prompt(prompt_name, prompt_dir="prompts/refinement")
+    template_only = prompt[prompt.rindex("```json") :]
+    assert tokens.expected_output_tokens("", prompt) >= (
+        tokens.expected_output_tokens("", template_only) + tokens.MIN_PROSE_TOKENS
+    )
+
+
+def test_truncated_answer_is_retried_once_with_a_larger_limit(monkeypatch):
+    from models.simulated import SimulatedModel
+
+    monkeypatch.setattr(tokens, "MIN_OUTPUT_TOKENS", 100)
+    monkeypatch.setattr(tokens, "OUTPUT_HEADROOM", 0.1)
+    monkeypatch.setattr(tokens, "TRUNCATION_RETRY_FACTOR", 1.2)
+    system_prompt = get_prompt("mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring")
+    model = SimulatedModel(model_name="gpt-4.1", system_prompt=system_prompt, time_scale=0)
+
+    assert model.query_with_retry("The system shall log in.") is None
+    assert model.call_state().attempts == 2
+    assert model.call_state().error_class == "MaxTokens"
@@ -0,0 +1,70 @@
+import json
+import time
+
+from util.scoring import RequirementResult
+from util.work_queue import Worker, connect
+
+
+def _queue(db_path, n=2):
+    conn = connect(db_path)
+    conn.execute(
+        "INSERT INTO configs VALUES (?, ?, ?, ?, ?, ?)",
+        ("sim", "Simulated", "simulated", 0, json.dumps({"time_scale": 0}), "Score it."),
+    )
+    conn.executemany(
+        "INSERT INTO tasks (task_id, config_id, position, requirement, requirement_type) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [(f"sim:{i}", "sim", i, f"The system shall do {i}.", "F") for i in range(n)],
+    )
+    conn.close()
+
+
+def _result(task, worker):
+    return RequirementResult(
+        original_requirement=task.requirement,
+        requirement_type=task.requirement_type,
+        model_name=worker,
+        score_response={},
+        overall_score=3,
+        refined_requirement=None,
+        refined_response=None,
+        refined_score=None,
+        refined_score_raw_response=None,
+    )
+
+
+def test_expired_lease_is_reclaimed_and_charged_an_attempt(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    _queue(db_path, n=1)
+    crashed = Worker(db_path, worker_id="crashed", lease_seconds=0.01, max_attempts=2)
+    other = Worker(db_path, worker_id="other", lease_seconds=0.01, max_attempts=2)
+    conn = connect(db_path)
+
+    assert [t.task_id for t in crashed.lease(conn)] == ["sim:0"]
+    time.sleep(0.05)
+    (task,) = other.lease(conn)
+    assert task.attempts == 1
+    assert not crashed.renew(conn, task)
+
+    # A second expiry uses up the last attempt
+    time.sleep(0.05)
+    assert other.lease(conn) == []
+    assert conn.execute("SELECT status, attempts FROM tasks").fetchone() == ("failed", 2)
+
+
+def test_commit_is_idempotent(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    _queue(db_path, n=1)
+    slow = Worker(db_path, worker_id="slow", lease_seconds=0.01)
+    fast = Worker(db_path, worker_id="fast", lease_seconds=60)
+    conn = connect(db_path)
+
+    (late,) = slow.lease(conn)
+    time.sleep(0.05)
+    (task,) = fast.lease(conn)
+    fast.commit(conn, task, _result(task, "fast"))
+    slow.commit(conn, late, _result(late, "slow"))
+    slow.commit(conn, late, None)
+
+    assert conn.execute("SELECT worker FROM results").fetchall() == [("fast",)]
+    assert conn.execute("SELECT status FROM tasks").fetchone() == ("done",)
@@ -0,0 +1,371 @@
+"""
+Experiment-grid runner over models x prompt files x temperatures.
+
+A grid is declared in a JSON file, e.g. grids/scoring_sweep.json:
+
+    {
+        "name": "scoring_sweep",
+        "stage": "scoring",
+        "models": [
+            {"provider": "GPT", "model_name": "gpt-5-mini", "temperatures": [1]},
+            {"provider": "Google", "model_name": "gemini-2.5-flash"}
+        ],
+        "prompts": ["prompts/scoring/scoring_v4.txt"],
+        "temperatures": [0, 0.25],
+        "sample": {"csv": "data/software-requirements-dataset/requirements.csv", "n": 50},
+        "max_workers": 16,
+        "rate_limits": {"GPT": 500, "Google": 150}
+    }
+
+For "scoring" grids the prompt file is the system prompt and the requirement is the
+user message. For "refinement" grids the prompt file is a template with
+{{ REQUIREMENT }} / {{ SCORING_ANALYSIS }} placeholders, filled from an existing
+scores file given as "scores_from".
+
+Identical calls (same provider, model, temperature, other model arguments such as
+base_url, system prompt and user message) are executed once and shared between cells. Completed calls are appended to
+results/grids/<name>/calls.jsonl, so an interrupted grid resumes where it stopped.
+
+    python -m util.grid grids/scoring_sweep.json
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from models import registry
+from models.base_model import BaseModel
+from util.json_utils import clean_json_output
+from util.pricing import estimate_cost
+from util.result_store import BlobStore, ResultTable
+from util.scheduler import Scheduler
+from util.scoring import (
+    RequirementResult,
+    clean_text,
+    extract_basic_score,
+    load_requirements,
+    write_model_results,
+)
+
+
+@dataclass
+class Cell:
+    cell_id: str
+    provider: str
+    model_name: str
+    prompt_file: str
+    temperature: float
+    model_kwargs: dict
+    system_prompt: str
+    # (call key, requirement, requirement type, user prompt)
+    rows: List[Tuple[str, str, str, str]] = field(default_factory=list)
+
+
+@dataclass
+class CallOutcome:
+    key: str
+    response: Optional[dict]
+    overall_score: Optional[int]
+    latency: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: Optional[float] = None
+    completed_at: float = field(default_factory=time.time)
+
+
+def _extra_kwargs(model_kwargs: Optional[dict]) -> dict:
+    """Model constructor arguments other than the model name (e.g. base_url)."""
+    return {k: v for k, v in (model_kwargs or {}).items() if k != "model_name"}
+
+
+def call_key(
+    provider: str,
+    model_name: str,
+    temperature: float,
+    system_prompt: str,
+    prompt: str,
+    model_kwargs: Optional[dict] = None,
+) -> str:
+    fields = [provider, model_name, float(temperature), system_prompt, prompt]
+    extra = _extra_kwargs(model_kwargs)
+    if extra:
+        # Only present when set, so keys of plain configurations stay stable
+        fields.append(extra)
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _read_prompt(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+def _sample(spec: dict) -> pd.DataFrame:
+    """Rows with "Requirement", "Type" and, for refinement grids, "Analysis"."""
+    sample = spec.get("sample", {})
+    n = sample.get("n", 100)
+    random_state = sample.get("random_state", 42)
+
+    if spec.get("stage", "scoring") == "refinement":
+        with open(spec["scores_from"], "r") as f:
+            scored = pd.DataFrame(json.load(f))
+        scored = scored.sample(n=min(n, len(scored)), random_state=random_state)
+        return pd.DataFrame(
+            {
+                "Requirement": scored["original_requirement"].apply(clean_text),
+                "Type": scored["requirement_type"],
+                "Analysis": scored["score_response"].apply(json.dumps),
+            }
+        )
+
+    return load_requirements(
+        sample.get("csv", "data/software-requirements-dataset/requirements.csv"),
+        n=n,
+        random_state=random_state,
+    )
+
+
+def build_cells(spec: dict, requirements_df: pd.DataFrame) -> List[Cell]:
+    stage = spec.get("stage", "scoring")
+    if stage not in ("scoring", "refinement"):
+        raise ValueError("Grid stage must be 'scoring' or 'refinement'.")
+
+    cells = []
+    for model_spec, prompt_file in itertools.product(spec["models"], spec["prompts"]):
+        model_spec = dict(model_spec)
+        provider = model_spec.pop("provider")
+        temperatures = model_spec.pop("temperatures", spec.get("temperatures", [0]))
+        refinement_system_prompt = model_spec.pop(
+            "system_prompt", BaseModel.__init__.__defaults__[1]
+        )
+        model_name = model_spec.get("model_name", provider)
+        template = _read_prompt(prompt_file)
+
+        for temperature in temperatures:
+            system_prompt = template if stage == "scoring" else refinement_system_prompt
+            prompt_name = os.path.splitext(os.path.basename(prompt_file))[0]
+            cell_id = f"{model_name}__{prompt_name}__t{temperature}".replace("/", "_")
+            extra = _extra_kwargs(model_spec)
+            if extra:
+                kwargs_hash = hashlib.sha256(
+                    json.dumps(extra, sort_keys=True, default=str).encode("utf-8")
+                ).hexdigest()[:8]
+                cell_id = f"{cell_id}__{kwargs_hash}"
+            if any(c.cell_id == cell_id for c in cells):
+                continue
+            cell = Cell(
+                cell_id=cell_id,
+                provider=provider,
+                model_name=model_name,
+                prompt_file=prompt_file,
+                temperature=temperature,
+                model_kwargs=model_spec,
+                system_prompt=system_prompt,
+            )
+            for _, row in requirements_df.iterrows():
+                if stage == "scoring":
+                    prompt = row["Requirement"]
+                else:
+                    prompt = template.replace(
+                        "{{ REQUIREMENT }}", row["Requirement"]
+                    ).replace("{{ SCORING_ANALYSIS }}", row["Analysis"])
+                key = call_key(
+                    provider, model_name, temperature, system_prompt, prompt, model_spec
+                )
+                cell.rows.append((key, row["Requirement"], row["Type"], prompt))
+            cells.append(cell)
+    return cells
+
+
+class GridRunner:
+    """
+    Run every cell of a grid through one shared Scheduler.
+
+    Args:
+        spec (dict): The parsed grid declaration.
+        output_dir (str): Base directory for grid outputs.
+    """
+
+    def __init__(self, spec: dict, output_dir: str = "results/grids"):
+        self.spec = spec
+        self.stage = spec.get("stage", "scoring")
+        self.grid_dir = os.path.join(output_dir, spec["name"])
+        self.calls_path = os.path.join(self.grid_dir, "calls.jsonl")
+        self._lock = threading.Lock()
+        self._outcomes: Dict[str, CallOutcome] = {}
+        self._models: Dict[str, BaseModel] = {}
+
+    def _load_completed(self) -> int:
+        if not os.path.exists(self.calls_path):
+            return 0
+        with open(self.calls_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    outcome = CallOutcome(**json.loads(line))
+                    self._outcomes[outcome.key] = outcome
+        return len(self._outcomes)
+
+    def _model(self, cell: Cell) -> BaseModel:
+        # One instance per (provider, model, prompt, temperature) configuration
+        key = call_key(
+            cell.provider,
+            cell.model_name,
+            cell.temperature,
+            cell.system_prompt,
+            "",
+            cell.model_kwargs,
+        )
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = registry.create(
+                    cell.provider,
+                    temperature=cell.temperature,
+                    system_prompt=cell.system_prompt,
+                    **cell.model_kwargs,
+                )
+            return self._models[key]
+
+    def _execute(self, model: BaseModel, key: str, prompt: str) -> CallOutcome:
+        start = time.perf_counter()
+        response = model.query_with_retry(prompt)
+        latency = time.perf_counter() - start
+        usage = model.call_state()  # Usage of the call that just finished on this thread
+
+        cleaned = clean_json_output(response) if response else None
+        outcome = CallOutcome(
+            key=key,
+            response=cleaned,
+            overall_score=extract_basic_score(cleaned) if cleaned else None,
+            latency=latency,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cost=estimate_cost(
+                model.model_name,
+                usage.input_tokens,
+                usage.output_tokens,
+                usage.cached_tokens,
+            ),
+        )
+        with self._lock:
+            self._outcomes[key] = outcome
+            # Failed calls are not persisted, so they are retried on resume
+            if cleaned is not None:
+                with open(self.calls_path, "a") as f:
+                    f.write(json.dumps(outcome.__dict__) + "\n")
+        return outcome
+
+    def run(self) -> pd.DataFrame:
+        """Run (or resume) the grid and return the per-cell timing and cost table."""
+        os.makedirs(self.grid_dir, exist_ok=True)
+        requirements_df = _sample(self.spec)
+        cells = build_cells(self.spec, requirements_df)
+        resumed = self._load_completed()
+
+        scheduler = Scheduler(
+            max_workers=self.spec.get("max_workers", 8),
+            rate_limits=self.spec.get("rate_limits"),
+            max_in_flight=self.spec.get("max_in_flight"),
+        )
+        futures = {}
+        submitted_by: Dict[str, str] = {}
+        total_rows = 0
+        grid_started = time.time()
+        for cell in cells:
+            for key, _, _, prompt in cell.rows:
+                total_rows += 1
+                if key in self._outcomes or key in futures:
+                    continue
+                futures[key] = scheduler.submit(
+                    cell.provider, self._execute, self._model(cell), key, prompt
+                )
+                submitted_by[key] = cell.cell_id
+        print(
+            f"Grid '{self.spec['name']}': {len(cells)} cells, {total_rows} cell rows, "
+            f"{len(futures)} unique calls to run ({resumed} already completed)"
+        )
+
+        try:
+            for future in futures.values():
+                future.result()
+        finally:
+            scheduler.shutdown(cancel_futures=True)
+
+        rows = []
+        blobs = BlobStore()  # Calls shared between cells store their response once
+        for cell in cells:
+            results = ResultTable(blobs)
+            executed, shared, reused = 0, 0, 0
+            latency, tokens_in, tokens_out, cost = 0.0, 0, 0, 0.0
+            finished = grid_started
+            for key, requirement, req_type, _ in cell.rows:
+                outcome = self._outcomes.get(key)
+                if key not in futures:
+                    reused += 1
+                elif submitted_by[key] == cell.cell_id:
+                    executed += 1
+                    latency += outcome.latency
+                    tokens_in += outcome.input_tokens
+                    tokens_out += outcome.output_tokens
+                    cost += outcome.cost or 0.0
+                else:
+                    shared += 1
+                if key in futures:
+                    finished = max(finished, outcome.completed_at)
+                if outcome is None or outcome.response is None:
+                    continue
+                result = RequirementResult(
+                    original_requirement=requirement,
+                    requirement_type=req_type,
+                    model_name=cell.model_name,
+                    score_response=outcome.response if self.stage == "scoring" else None,
+                    overall_score=outcome.overall_score,
+                )
+                if self.stage == "refinement":
+                    result.refined_response = outcome.response
+                results.append(result)
+
+            write_model_results(cell.cell_id, results, output_dir=self.grid_dir)
+            rows.append(
+                {
+                    "cell": cell.cell_id,
+                    "rows": len(cell.rows),
+                    "ok": len(results),
+                    "executed": executed,
+                    "shared": shared,  # Deduplicated against another cell
+                    "resumed": reused,  # Completed in a previous run
+                    # Cells share one schedule, so wall time is measured from grid start
+                    "finished_after_s": finished - grid_started,
+                    "call_s": latency,
+                    "input_tokens": tokens_in,
+                    "output_tokens": tokens_out,
+                    "cost_usd": cost,
+                }
+            )
+
+        table = pd.DataFrame(rows)
+        table.to_csv(os.path.join(self.grid_dir, "cells.csv"), index=False)
+        return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an experiment grid")
+    parser.add_argument("grid", help="Path to the grid JSON declaration")
+    parser.add_argument("--output-dir", default="results/grids")
+    args = parser.parse_args()
+
+    with open(args.grid, "r") as f:
+        spec = json.load(f)
+    table = GridRunner(spec, output_dir=args.output_dir).run()
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
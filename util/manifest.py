@@ -0,0 +1,260 @@
+"""
+Incremental re-scoring.
+
+Every scored cell (requirement x model x prompt x parameters) is recorded in a
+manifest under the hash of its inputs: the system prompt content, the cleaned
+requirement text, the provider, the model and the temperature (util.grid.call_key).
+On the next run only cells whose hash is not in the manifest are scored, i.e. new
+requirements and requirements whose prompt file or parameters changed. The new
+results are merged into the existing <model>_scores.json: re-scored rows are
+replaced in place and new rows are appended. Rows are matched by requirement text
+and occurrence, so duplicate requirements keep a row each. A row whose re-scoring
+fails is dropped rather than left with a score from outdated inputs, and a score
+reused from a near-duplicate (ScoreIndex) is not recorded, so both are scored
+again on the next run.
+
+    incremental = IncrementalRun("results/manifest.json")
+    results = incremental.score(model, requirements_df)
+    incremental.print_report()
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from models.base_model import BaseModel
+from util.grid import call_key
+from util.pre_classifier import RouteDecision
+from util.result_store import ResultTable
+from util.scoring import (
+    RequirementResult,
+    get_prompt,
+    score_with_model,
+    write_model_results,
+)
+from util.semantic_cache import ScoreIndex
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _row_keys(requirements: Iterable[str]) -> List[Tuple[str, int]]:
+    """(text, n) for the n-th occurrence of each requirement text."""
+    seen: Counter = Counter()
+    row_keys = []
+    for requirement in requirements:
+        row_keys.append((requirement, seen[requirement]))
+        seen[requirement] += 1
+    return row_keys
+
+
+@dataclass
+class ModelReport:
+    model_name: str
+    cells: int = 0
+    skipped: int = 0  # Unchanged, served from the existing results
+    new: int = 0  # Requirement not scored before by this model
+    prompt_changed: int = 0
+    params_changed: int = 0
+    failed: int = 0
+    dropped: int = 0  # Outdated rows removed because their re-scoring failed
+    seconds: float = 0.0
+
+    @property
+    def executed(self) -> int:
+        return self.new + self.prompt_changed + self.params_changed
+
+
+class IncrementalRun:
+    """
+    Score only the cells whose inputs changed since the last run.
+
+    Args:
+        manifest_path (str): JSON manifest of input hashes, created if missing.
+        output_dir (str): Directory of the <model>_scores.json files.
+    """
+
+    def __init__(
+        self, manifest_path: str = "results/manifest.json", output_dir: str = "results"
+    ):
+        self.manifest_path = manifest_path
+        self.output_dir = output_dir
+        self.reports: List[ModelReport] = []
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                self.entries = json.load(f)["entries"]
+
+    def _output_path(self, model_name: str) -> str:
+        safe_model_name = re.sub(r"[^A-Za-z0-9_]", "_", model_name)
+        return os.path.join(self.output_dir, f"{safe_model_name}_scores.json")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": 1, "entries": self.entries}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def score(
+        self,
+        model: BaseModel,
+        requirements_df: pd.DataFrame,
+        routes: Optional[Dict[str, RouteDecision]] = None,
+        score_index: Optional[ScoreIndex] = None,
+    ) -> ResultTable:
+        """
+        Score the invalidated cells for one model and merge them into its results file.
+
+        Takes the same arguments as score_with_model. Returns the merged results.
+        """
+        start = time.perf_counter()
+        routes = routes or {}
+        output_path = self._output_path(model.model_name)
+        report = ModelReport(model.model_name)
+
+        existing: List[dict] = []
+        if os.path.exists(output_path):
+            with open(output_path, "r") as f:
+                existing = json.load(f)
+        existing_rows = set(_row_keys(row["original_requirement"] for row in existing))
+
+        # The previous entry for each requirement in this output file
+        previous = {
+            entry["requirement_sha"]: entry
+            for entry in self.entries.values()
+            if entry["output"] == output_path
+        }
+
+        keys: Dict[Tuple[str, int], str] = {}
+        prompt_shas: Dict[Tuple[str, int], str] = {}
+        todo, todo_rows = [], []
+        for (i, row), row_key in zip(
+            requirements_df.iterrows(), _row_keys(requirements_df["Requirement"])
+        ):
+            req = row["Requirement"]
+            decision = routes.get(req)
+            if decision and not decision.send_to_llm:
+                continue
+            system_prompt = (
+                get_prompt(decision.prompt_name, prompt_dir="prompts/scoring")
+                if decision and decision.prompt_name
+                else model.system_prompt
+            )
+            key = call_key(
+                model.provider, model.model_name, model.temperature, system_prompt, req
+            )
+            keys[row_key], prompt_shas[row_key] = key, _sha(system_prompt)
+            report.cells += 1
+
+            if key in self.entries and row_key in existing_rows:
+                report.skipped += 1
+                continue
+            todo.append(i)
+            todo_rows.append(row_key)
+            entry = previous.get(_sha(req))
+            if entry is None or row_key not in existing_rows:
+                report.new += 1
+            elif entry["prompt_sha"] != _sha(system_prompt):
+                report.prompt_changed += 1
+            else:
+                report.params_changed += 1
+
+        fresh = ResultTable()
+        if todo:
+            fresh = score_with_model(
+                model, requirements_df.loc[todo], routes, score_index
+            )
+        report.failed = len(todo) - len(fresh)
+
+        # Results come back in row order, minus the failures: give each one the
+        # next unfilled row with its text. Chunks of over-long requirements match none.
+        waiting: Dict[str, List[Tuple[str, int]]] = {}
+        for row_key in todo_rows:
+            waiting.setdefault(row_key[0], []).append(row_key)
+        scored: Dict[Tuple[str, int], RequirementResult] = {}
+        unmatched = []
+        for result in fresh:
+            rows = waiting.get(result.original_requirement)
+            if rows:
+                scored[rows.pop(0)] = result
+            else:
+                unmatched.append(result)
+
+        # Replace re-scored rows in place, drop those that failed, append new ones
+        attempted = set(todo_rows)
+        fields = RequirementResult.__dataclass_fields__
+        merged = ResultTable(fresh.blobs)
+        new_rows = dict(scored)
+        for row, row_key in zip(
+            existing, _row_keys(row["original_requirement"] for row in existing)
+        ):
+            if row_key in new_rows:
+                merged.append(new_rows.pop(row_key))
+            elif row_key in attempted:
+                report.dropped += 1
+            else:
+                merged.append(
+                    RequirementResult(**{k: v for k, v in row.items() if k in fields})
+                )
+        del existing
+        merged.extend(new_rows.values())
+        merged.extend(unmatched)
+        write_model_results(model.model_name, merged, output_dir=self.output_dir)
+
+        # Attempted requirements drop entries for outdated inputs. Failed cells and
+        # reused scores, which were not produced with these inputs, are not recorded.
+        attempted_shas = {_sha(req) for req, _ in todo_rows}
+        current = set(keys.values())
+        self.entries = {
+            key: entry
+            for key, entry in self.entries.items()
+            if not (
+                entry["output"] == output_path
+                and entry["requirement_sha"] in attempted_shas
+                and key not in current
+            )
+        }
+        for row_key, result in scored.items():
+            if result.reused_from:
+                continue
+            self.entries[keys[row_key]] = {
+                "output": output_path,
+                "model_name": model.model_name,
+                "provider": model.provider,
+                "temperature": model.temperature,
+                "prompt_sha": prompt_shas[row_key],
+                "requirement_sha": _sha(row_key[0]),
+                "completed_at": time.time(),
+            }
+        self._save()
+
+        report.seconds = time.perf_counter() - start
+        self.reports.append(report)
+        return merged
+
+    def report(self) -> pd.DataFrame:
+        rows = [
+            {**report.__dict__, "executed": report.executed} for report in self.reports
+        ]
+        return pd.DataFrame(rows)
+
+    def print_report(self):
+        table = self.report()
+        if table.empty:
+            return
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+        cells, skipped = table["cells"].sum(), table["skipped"].sum()
+        print(
+            f"Skipped {skipped}/{cells} cells ({skipped / cells:.0%}) whose inputs were unchanged"
+            if cells
+            else "No cells to score"
+        )
@@ -0,0 +1,314 @@
+"""
+Parallel expert panel (imgs/multiple_checkers.png).
+
+mixture_of_opinions_v2.txt asks one model to play every expert in one long
+generation. Here the panel is split into one prompt per expert, taken from the
+same prompt file, and the experts run concurrently, on the same model or on
+different ones. Their answers are aggregated back into the mixture_of_opinions
+output format (expert_assessments, consensus_assessment, overall_score), so
+downstream code does not change.
+
+With a quorum, every expert casts a pass/fail vote (overall score >= threshold).
+Once enough votes are in that the remaining experts can no longer change the
+outcome, the remaining experts are cancelled. Experts still queued are never
+called. Experts already running are abandoned and their answers ignored.
+"""
+
+import json
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from tqdm import tqdm
+
+from models.base_model import BaseModel
+from util.json_utils import clean_json_output
+from util.scheduler import Scheduler
+from util.scoring import RequirementResult, extract_basic_score
+
+
+@dataclass
+class Expert:
+    key: str  # Key in "expert_assessments", e.g. "incose_expert"
+    title: str
+    system_prompt: str
+
+
+def split_panel_prompt(prompt: str) -> List[Expert]:
+    """
+    Split a multi-expert panel prompt into one standalone prompt per expert.
+
+    The experts are the "###" sections under "## Expert Panel Composition", matched
+    in order with the keys of "expert_assessments" in the output template. The
+    shared sections (assessment process, guidelines, examples) are kept, and the
+    output format is reduced to a single expert's assessment.
+    """
+    sections = re.split(r"^## ", prompt, flags=re.MULTILINE)
+    composition = next(
+        (s for s in sections if s.startswith("Expert Panel Composition")), None
+    )
+    output_format = next((s for s in sections if s.startswith("Output Format")), None)
+    if composition is None or output_format is None:
+        raise ValueError(
+            "Panel prompt needs '## Expert Panel Composition' and '## Output Format' sections."
+        )
+
+    # Some prompts continue with notes after the JSON template
+    template, _ = json.JSONDecoder().raw_decode(output_format[output_format.index("{") :])
+    keys = list(template["expert_assessments"])
+    profiles = re.split(r"^### ", composition, flags=re.MULTILINE)[1:]
+    if len(profiles) != len(keys):
+        raise ValueError(
+            f"Panel prompt describes {len(profiles)} experts but the output template has {len(keys)}."
+        )
+
+    shared = [
+        "## " + s.strip()
+        for s in sections[1:]
+        if not s.startswith(("Expert Panel Composition", "Output Format"))
+    ]
+    single_format = json.dumps(template["expert_assessments"][keys[0]], indent=2)
+
+    experts = []
+    for key, profile in zip(keys, profiles):
+        title, _, description = profile.partition("\n")
+        title = title.strip()
+        system_prompt = "\n\n".join(
+            [
+                f"# Requirements Quality Assessment: {title}",
+                f"You are the {title} on a panel of expert assessors evaluating a "
+                "software requirement. Provide your own independent assessment.",
+                description.strip(),
+                *shared,
+                "## Output Format\n\nProvide your assessment in the following JSON "
+                "format (using numbers from 0-100):\n\n" + single_format,
+            ]
+        )
+        experts.append(Expert(key, title, system_prompt))
+    return experts
+
+
+def aggregate(assessments: Dict[str, dict]) -> dict:
+    """
+    Combine per-expert assessments into the mixture_of_opinions output format.
+
+    The consensus score per criterion is the mean over the experts, with the
+    justification of the harshest expert. The overall score is the mean of the
+    experts' overall scores.
+    """
+    criteria: Dict[str, List[Tuple[int, str]]] = {}
+    overall = []
+    for assessment in assessments.values():
+        # Some models wrap a single assessment in "consensus_assessment" anyway
+        scores = assessment.get("scores") or assessment.get(
+            "consensus_assessment", {}
+        ).get("scores", {})
+        for criterion, entry in scores.items():
+            if isinstance(entry, dict) and isinstance(entry.get("score"), (int, float)):
+                criteria.setdefault(criterion, []).append(
+                    (entry["score"], entry.get("justification", ""))
+                )
+        score = extract_basic_score(assessment)
+        if score is not None:
+            overall.append(score)
+
+    consensus = {
+        criterion: {
+            "score": round(sum(score for score, _ in entries) / len(entries)),
+            "justification": min(entries, key=lambda e: e[0])[1],
+        }
+        for criterion, entries in criteria.items()
+    }
+    return {
+        "expert_assessments": assessments,
+        "consensus_assessment": {"scores": consensus},
+        "overall_score": round(sum(overall) / len(overall)) if overall else None,
+    }
+
+
+@dataclass
+class PanelStats:
+    requirements: int = 0
+    expert_calls: int = 0
+    cancelled: int = 0  # Never called
+    abandoned: int = 0  # Called, answer ignored
+    failed: int = 0
+    early_decisions: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "requirements": self.requirements,
+            "expert_calls": self.expert_calls,
+            "cancelled": self.cancelled,
+            "abandoned": self.abandoned,
+            "failed": self.failed,
+            "early_decisions": self.early_decisions,
+            "mean_latency_s": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p95_latency_s": latencies[int(0.95 * (len(latencies) - 1))]
+            if latencies
+            else 0.0,
+        }
+
+
+class ExpertPanel:
+    """
+    Score requirements with concurrent single-expert calls.
+
+    Args:
+        experts (Dict[str, BaseModel]): Expert key -> model carrying that expert's
+            system prompt (see `from_prompt`).
+        threshold (int): Overall score an expert must give to vote "pass".
+        quorum (int): Pass votes needed to pass. None runs every expert.
+        scheduler (Scheduler): Shared scheduler, a private one is created if None.
+    """
+
+    def __init__(
+        self,
+        experts: Dict[str, BaseModel],
+        threshold: int = 70,
+        quorum: Optional[int] = None,
+        scheduler: Optional[Scheduler] = None,
+        max_workers: int = 16,
+    ):
+        if quorum is not None and not 1 <= quorum <= len(experts):
+            raise ValueError(f"Quorum must be between 1 and {len(experts)}.")
+        self.experts = experts
+        self.threshold = threshold
+        self.quorum = quorum
+        self.scheduler = scheduler or Scheduler(max_workers=max_workers)
+        self.stats = PanelStats()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_prompt(
+        cls,
+        model_factory: Callable[[str], BaseModel],
+        prompt_file: str = "prompts/scoring/mixture_of_opinions_v2.txt",
+        **kwargs,
+    ) -> "ExpertPanel":
+        """
+        Build a panel from a multi-expert prompt file.
+
+        `model_factory(system_prompt)` creates the model for each expert, e.g.
+        `lambda prompt: GPT(model_name="gpt-4.1", system_prompt=prompt)`. It can
+        return a different provider per call to mix models on one panel.
+        """
+        with open(prompt_file, "r") as f:
+            experts = split_panel_prompt(f.read())
+        return cls({e.key: model_factory(e.system_prompt) for e in experts}, **kwargs)
+
+    def _ask(self, model: BaseModel, requirement: str) -> Optional[dict]:
+        response = model.query_with_retry(requirement)
+        return clean_json_output(response) if response else None
+
+    def _decided(self, passes: int, fails: int) -> Optional[str]:
+        if self.quorum is None:
+            return None
+        if passes >= self.quorum:
+            return "pass"
+        if fails > len(self.experts) - self.quorum:
+            return "fail"
+        return None
+
+    def score(self, requirement: str) -> Optional[dict]:
+        """Score one requirement, returning the aggregated panel response."""
+        start = time.perf_counter()
+        futures: Dict[Future, str] = {
+            self.scheduler.submit(model.provider, self._ask, model, requirement): key
+            for key, model in self.experts.items()
+        }
+        assessments: Dict[str, dict] = {}
+        failed_experts: List[str] = []
+        passes = fails = 0
+        decision = None
+
+        pending = set(futures)
+        while pending and decision is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    assessment = future.result()
+                except Exception as e:  # e.g. BudgetExceeded, counted as a failed expert
+                    print(f"Expert {futures[future]} failed: {e}")
+                    assessment = None
+                score = extract_basic_score(assessment) if assessment else None
+                if score is None:
+                    failed_experts.append(futures[future])
+                    continue
+                assessments[futures[future]] = assessment
+                if score >= self.threshold:
+                    passes += 1
+                else:
+                    fails += 1
+            # A failed expert cannot vote pass any more either
+            decision = self._decided(passes, fails + len(failed_experts))
+
+        cancelled = sum(future.cancel() for future in pending)
+        with self._lock:
+            stats = self.stats
+            stats.requirements += 1
+            stats.expert_calls += len(futures) - cancelled
+            stats.cancelled += cancelled
+            stats.abandoned += len(pending) - cancelled
+            stats.failed += len(failed_experts)
+            stats.early_decisions += bool(pending)
+            stats.latencies.append(time.perf_counter() - start)
+
+        if not assessments:
+            return None
+        response = aggregate(assessments)
+        if self.quorum is not None:
+            response["panel_decision"] = {
+                "decision": decision or ("pass" if passes >= self.quorum else "fail"),
+                "pass_votes": passes,
+                "fail_votes": fails,
+                "experts_answered": len(assessments),
+                "experts_skipped": len(pending),
+                # Which experts the aggregate above is built from
+                "aggregated_experts": list(assessments),
+                "skipped_experts": [futures[future] for future in pending],
+                "failed_experts": failed_experts,
+            }
+        return response
+
+    def score_requirement(self, requirement: str, req_type: str) -> Optional[RequirementResult]:
+        response = self.score(requirement)
+        if response is None:
+            print(f"Panel returned no assessment for requirement: {requirement}")
+            return None
+        return RequirementResult(
+            original_requirement=requirement,
+            requirement_type=req_type,
+            model_name=self.name,
+            score_response=response,
+            overall_score=response["overall_score"],
+        )
+
+    @property
+    def name(self) -> str:
+        model_names = sorted({m.model_name for m in self.experts.values()})
+        return f"panel[{'+'.join(model_names)}]"
+
+    def score_all(
+        self, requirements_df: pd.DataFrame, max_concurrent: int = 8, progress: bool = True
+    ) -> List[RequirementResult]:
+        """Score a DataFrame of requirements, `max_concurrent` requirements at a time."""
+        rows = [(row["Requirement"], row["Type"]) for _, row in requirements_df.iterrows()]
+        # Each requirement thread only waits on its own experts, which run on the
+        # shared scheduler, so panels for different requirements overlap
+        with ThreadPoolExecutor(max_workers=max_concurrent) as pool:
+            results = list(
+                tqdm(
+                    pool.map(lambda row: self.score_requirement(*row), rows),
+                    total=len(rows),
+                    desc=self.name,
+                    disable=not progress,
+                )
+            )
+        return [r for r in results if r is not None]
@@ -0,0 +1,250 @@
+"""
+Streaming score -> refine -> re-score pipeline.
+
+Each stage has its own worker threads and reads from a bounded queue, so a
+requirement is refined as soon as its score comes back and re-scored as soon as the
+refinement is done. All three stages run at the same time; the bounded queues keep a
+fast stage from running far ahead of a slow one.
+
+The refinement and re-scoring calls are separate, context-free calls (see the
+notes on score inflation when one session both grades and rewrites).
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from models.base_model import BaseModel
+from util.result_store import ResultTable
+from util.scoring import (
+    refine_requirement,
+    rescore_requirement,
+    score_requirement,
+)
+
+_DONE = object()  # End-of-stream marker, one per downstream worker
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+    depth_samples: List[int] = field(default_factory=list)  # Inbox queue depth
+
+    def summary(self, wall_seconds: float) -> dict:
+        active = (
+            self.last_end - self.first_start
+            if self.first_start is not None and self.last_end is not None
+            else 0.0
+        )
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "throughput_per_s": self.processed / active if active else 0.0,
+            "mean_latency_s": self.busy_seconds / self.processed
+            if self.processed
+            else 0.0,
+            "utilization": self.busy_seconds / (self.workers * wall_seconds)
+            if wall_seconds
+            else 0.0,
+            "mean_queue_depth": sum(self.depth_samples) / len(self.depth_samples)
+            if self.depth_samples
+            else 0.0,
+            "max_queue_depth": max(self.depth_samples, default=0),
+        }
+
+
+class _Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        failed: Callable,
+        workers: int,
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        downstream_workers: int,
+    ):
+        self.stats = StageStats(name, workers)
+        self.inbox = inbox
+        self._fn = fn
+        self._failed = failed
+        self._outbox = outbox
+        self._downstream_workers = downstream_workers
+        self._lock = threading.Lock()
+        self._exited = 0
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def _work(self):
+        while True:
+            item = self.inbox.get()
+            if item is _DONE:
+                with self._lock:
+                    self._exited += 1
+                    last = self._exited == self.stats.workers
+                if last:
+                    for _ in range(self._downstream_workers):
+                        self._outbox.put(_DONE)
+                return
+
+            start = time.perf_counter()
+            try:
+                result = self._fn(item)
+            except Exception as e:
+                print(f"Stage {self.stats.name} failed: {e}")
+                result = None
+            end = time.perf_counter()
+
+            with self._lock:
+                stats = self.stats
+                stats.processed += 1
+                stats.busy_seconds += end - start
+                stats.first_start = (
+                    start if stats.first_start is None else min(stats.first_start, start)
+                )
+                stats.last_end = end if stats.last_end is None else max(stats.last_end, end)
+                if result is None or self._failed(result):
+                    stats.failed += 1
+            if result is not None:
+                self._outbox.put(result)
+
+
+def run_pipeline(
+    requirements_df: pd.DataFrame,
+    scoring_model: BaseModel,
+    refinement_model: BaseModel,
+    refinement_template: str,
+    rescoring_model: Optional[BaseModel] = None,
+    workers: Optional[Dict[str, int]] = None,
+    queue_size: int = 8,
+    sample_interval: float = 0.1,
+) -> Tuple[ResultTable, List[dict]]:
+    """
+    Score, refine and re-score requirements with overlapping stages.
+
+    Args:
+        requirements_df (pd.DataFrame): Requirements with "Requirement" and "Type" columns.
+        scoring_model (BaseModel): Judge for the original requirement.
+        refinement_model (BaseModel): Model that rewrites the requirement.
+        refinement_template (str): Refinement prompt with {{ REQUIREMENT }} and
+            {{ SCORING_ANALYSIS }} placeholders.
+        rescoring_model (BaseModel): Judge for the refined requirement. Defaults to
+            the scoring model, so both scores come from the same judge.
+        workers (Dict[str, int]): Worker threads per stage ("score", "refine", "rescore").
+        queue_size (int): Capacity of each queue between stages.
+
+    Returns:
+        ResultTable: Results with the refined fields filled in, stored compactly as
+            they leave the last stage.
+        List[dict]: Per-stage throughput, latency, utilization and queue depth.
+    """
+    rescoring_model = rescoring_model or scoring_model
+    workers = {"score": 4, "refine": 4, "rescore": 4, **(workers or {})}
+
+    score_in = queue.Queue(maxsize=queue_size)
+    refine_in = queue.Queue(maxsize=queue_size)
+    rescore_in = queue.Queue(maxsize=queue_size)
+    done = queue.Queue()  # Unbounded sink
+
+    stages = [
+        _Stage(
+            "score",
+            lambda row: score_requirement(scoring_model, row[0], row[1]),
+            lambda result: False,
+            workers["score"],
+            score_in,
+            refine_in,
+            workers["refine"],
+        ),
+        _Stage(
+            "refine",
+            lambda result: refine_requirement(
+                result, refinement_model, refinement_template
+            ),
+            lambda result: result.refined_requirement is None,
+            workers["refine"],
+            refine_in,
+            rescore_in,
+            workers["rescore"],
+        ),
+        _Stage(
+            "rescore",
+            lambda result: rescore_requirement(result, rescoring_model),
+            lambda result: result.refined_score is None,
+            workers["rescore"],
+            rescore_in,
+            done,
+            1,
+        ),
+    ]
+
+    finished = threading.Event()
+
+    def sample_depths():
+        while not finished.wait(sample_interval):
+            for stage in stages:
+                stage.stats.depth_samples.append(stage.inbox.qsize())
+
+    sampler = threading.Thread(target=sample_depths, daemon=True)
+    start = time.perf_counter()
+    for stage in stages:
+        for thread in stage.threads:
+            thread.start()
+    sampler.start()
+
+    # Feeding blocks while the score queue is full, which is the back-pressure
+    for _, row in requirements_df.iterrows():
+        score_in.put((row["Requirement"], row["Type"]))
+    for _ in range(workers["score"]):
+        score_in.put(_DONE)
+
+    results = ResultTable()
+    while True:
+        item = done.get()
+        if item is _DONE:
+            break
+        results.append(item)
+    wall = time.perf_counter() - start
+    finished.set()
+    sampler.join()
+
+    report = [stage.stats.summary(wall) for stage in stages]
+    print(f"Pipeline processed {len(results)} requirements in {wall:.1f}s")
+    return results, report
+
+
+if __name__ == "__main__":
+    from models import registry
+    from util.scoring import get_prompt, load_requirements, write_model_results
+
+    scoring_prompt = get_prompt(
+        "mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring"
+    )
+    refinement_template = get_prompt(
+        "refinement_v2.txt", prompt_dir="prompts/refinement"
+    )
+
+    scorer = registry.create("GPT", model_name="gpt-4.1", system_prompt=scoring_prompt)
+    refiner = registry.create(
+        "Mistral", model_name="mistral-medium-latest", temperature=0.25
+    )
+
+    results, report = run_pipeline(
+        load_requirements(n=20), scorer, refiner, refinement_template
+    )
+    write_model_results(f"{scorer.model_name}__refined_by__{refiner.model_name}", results)
+    print(pd.DataFrame(report).to_string(index=False))
@@ -0,0 +1,369 @@
+"""
+Local, CPU-only pre-classifier used to triage requirements before any LLM call.
+
+Two small TF-IDF + linear models are trained in a few seconds:
+    - a category classifier on the labelled PURE sentences (security, reliability,
+      other non-functional, functional), enriched with the PROMISE types from
+      requirements.csv
+    - a quality prior (ridge regression) on the overall scores the LLM judges have
+      already produced in results/
+
+The prior is used to route requirements: only those that are predicted to be
+deficient, or that fall close to the quality threshold, are sent to the LLM judges.
+The requirements being routed must be left out of the prior's training data
+(`PreClassifier.train(exclude=...)`), otherwise routing them replays the LLM scores
+the prior memorised. `routing_report` measures accuracy on such held-out
+requirements only.
+"""
+
+import glob
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.model_selection import KFold, train_test_split
+from sklearn.pipeline import Pipeline
+
+PURE_ANNOTATED_CSV = "data/PURE_requirements/kaggle/Pure_Annotate_Dataset.csv"
+PROMISE_CSV = "data/software-requirements-dataset/requirements.csv"
+RESULTS_DIR = "results"
+
+# PROMISE requirement types mapped onto the PURE label space
+PROMISE_CATEGORIES = {
+    "F": "functional",
+    "FR": "functional",
+    "SE": "security",
+    "A": "reliability",
+    "FT": "reliability",
+}
+
+
+@dataclass
+class RouteDecision:
+    requirement: str
+    category: str
+    category_confidence: float
+    quality_prior: float
+    send_to_llm: bool
+    prompt_name: Optional[str] = None  # Alternative scoring prompt for this category
+
+
+def _pure_category(row: pd.Series) -> str:
+    if row["security"] == 1:
+        return "security"
+    if row["reliability"] == 1:
+        return "reliability"
+    if row["NFR_boolean"] == 1:
+        return "non-functional"
+    return "functional"
+
+
+def _tfidf() -> TfidfVectorizer:
+    return TfidfVectorizer(
+        lowercase=True, ngram_range=(1, 2), min_df=2, sublinear_tf=True
+    )
+
+
+def load_category_data(
+    pure_csv: str = PURE_ANNOTATED_CSV, promise_csv: str = PROMISE_CSV
+) -> pd.DataFrame:
+    """
+    Load labelled sentences for the category classifier.
+
+    Returns:
+        pd.DataFrame: Columns "text" and "category".
+    """
+    # The PURE export contains a few cp1252 characters
+    pure_df = pd.read_csv(pure_csv, encoding="latin-1")
+    frames = [
+        pd.DataFrame(
+            {
+                "text": pure_df["sentence"].astype(str),
+                "category": pure_df.apply(_pure_category, axis=1),
+            }
+        )
+    ]
+
+    if promise_csv and os.path.exists(promise_csv):
+        promise_df = pd.read_csv(promise_csv).dropna(subset=["Requirement", "Type"])
+        frames.append(
+            pd.DataFrame(
+                {
+                    "text": promise_df["Requirement"].astype(str),
+                    "category": promise_df["Type"]
+                    .str.strip()
+                    .map(lambda t: PROMISE_CATEGORIES.get(t, "non-functional")),
+                }
+            )
+        )
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_quality_data(
+    results_dir: str = RESULTS_DIR, exclude: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    Collect the mean LLM overall score per requirement from existing result files.
+
+    Args:
+        results_dir (str): Directory of the <model>_scores.json files.
+        exclude (Iterable[str]): Requirements to leave out, e.g. the ones to be routed.
+
+    Returns:
+        pd.DataFrame: Columns "text" and "score".
+    """
+    excluded = set(exclude or ())
+    scores: Dict[str, List[int]] = {}
+    for path in sorted(glob.glob(os.path.join(results_dir, "*_scores.json"))):
+        with open(path, "r") as f:
+            for result in json.load(f):
+                if (
+                    result.get("overall_score") is None
+                    or result["original_requirement"] in excluded
+                ):
+                    continue
+                scores.setdefault(result["original_requirement"], []).append(
+                    result["overall_score"]
+                )
+
+    return pd.DataFrame(
+        {
+            "text": list(scores.keys()),
+            "score": [float(np.mean(v)) for v in scores.values()],
+        }
+    )
+
+
+class PreClassifier:
+    """
+    TF-IDF + linear models predicting requirement category and a quality prior.
+
+    Args:
+        quality_threshold (float): Overall score below which a requirement is
+            considered deficient and always sent to the LLM judges.
+        margin (float): Requirements predicted within this distance above the
+            threshold are still sent, since the prior is not reliable there.
+        category_prompts (Dict[str, str]): Optional scoring prompt file per category.
+    """
+
+    def __init__(
+        self,
+        quality_threshold: float = 35.0,
+        margin: float = 5.0,
+        category_prompts: Optional[Dict[str, str]] = None,
+    ):
+        self.quality_threshold = quality_threshold
+        self.margin = margin
+        self.category_prompts = category_prompts or {}
+        self.category_model: Optional[Pipeline] = None
+        self.quality_model: Optional[Pipeline] = None
+        self.quality_texts: set = set()  # Requirements the prior was trained on
+
+    @staticmethod
+    def _category_pipeline() -> Pipeline:
+        return Pipeline(
+            [
+                ("tfidf", _tfidf()),
+                (
+                    "clf",
+                    LogisticRegression(max_iter=1000, class_weight="balanced"),
+                ),
+            ]
+        )
+
+    @staticmethod
+    def _quality_pipeline() -> Pipeline:
+        tfidf = _tfidf()
+        tfidf.min_df = 1  # Only ~100 scored requirements so far
+        return Pipeline([("tfidf", tfidf), ("reg", Ridge(alpha=1.0))])
+
+    def fit(
+        self, category_df: pd.DataFrame, quality_df: pd.DataFrame
+    ) -> "PreClassifier":
+        self.category_model = self._category_pipeline().fit(
+            category_df["text"], category_df["category"]
+        )
+        self.quality_model = self._quality_pipeline().fit(
+            quality_df["text"], quality_df["score"]
+        )
+        self.quality_texts = set(quality_df["text"])
+        return self
+
+    @classmethod
+    def train(
+        cls,
+        pure_csv: str = PURE_ANNOTATED_CSV,
+        promise_csv: str = PROMISE_CSV,
+        results_dir: str = RESULTS_DIR,
+        exclude: Optional[Iterable[str]] = None,
+        **kwargs,
+    ) -> "PreClassifier":
+        """
+        Train both models from the default data locations.
+
+        `exclude` lists requirements kept out of the quality prior, normally the ones
+        that will be routed.
+        """
+        start = time.perf_counter()
+        classifier = cls(**kwargs).fit(
+            load_category_data(pure_csv, promise_csv),
+            load_quality_data(results_dir, exclude),
+        )
+        print(f"Pre-classifier trained in {time.perf_counter() - start:.2f}s")
+        return classifier
+
+    def should_send(self, quality_prior: float) -> bool:
+        return quality_prior < self.quality_threshold + self.margin
+
+    def route(self, requirements: List[str]) -> List[RouteDecision]:
+        """
+        Predict category and quality prior for a batch of requirements.
+
+        Args:
+            requirements (List[str]): Requirement texts.
+
+        Returns:
+            List[RouteDecision]: One routing decision per requirement.
+        """
+        if self.category_model is None or self.quality_model is None:
+            raise ValueError("PreClassifier must be trained before routing.")
+        if not requirements:
+            return []
+
+        probabilities = self.category_model.predict_proba(requirements)
+        classes = self.category_model.classes_
+        priors = self.quality_model.predict(requirements)
+
+        decisions = []
+        for req, probs, prior in zip(requirements, probabilities, priors):
+            best = int(np.argmax(probs))
+            category = str(classes[best])
+            decisions.append(
+                RouteDecision(
+                    requirement=req,
+                    category=category,
+                    category_confidence=float(probs[best]),
+                    quality_prior=float(prior),
+                    send_to_llm=self.should_send(float(prior)),
+                    prompt_name=self.category_prompts.get(category),
+                )
+            )
+        return decisions
+
+    def routing_report(
+        self, decisions: List[RouteDecision], quality_df: pd.DataFrame
+    ) -> Dict[str, float]:
+        """
+        Compare routing decisions with the observed mean LLM scores.
+
+        Only requirements that have LLM scores and were not in the prior's training
+        data count, so the accuracy is held out. A requirement should have been sent
+        if the LLM judges scored it below the threshold.
+
+        Returns:
+            dict: Held-out count, routing accuracy, missed deficient requirements and
+                the fraction of all decisions sent to the LLM.
+        """
+        observed = dict(zip(quality_df["text"], quality_df["score"]))
+        held_out = [
+            d
+            for d in decisions
+            if d.requirement in observed and d.requirement not in self.quality_texts
+        ]
+        sent = np.array([d.send_to_llm for d in held_out], dtype=bool)
+        needed = np.array(
+            [observed[d.requirement] < self.quality_threshold for d in held_out],
+            dtype=bool,
+        )
+        return {
+            "held_out": len(held_out),
+            "routing_accuracy": float(np.mean(sent == needed)) if held_out else float("nan"),
+            "missed_deficient": int(np.sum(needed & ~sent)),
+            "llm_call_fraction": float(np.mean([d.send_to_llm for d in decisions]))
+            if decisions
+            else 0.0,
+        }
+
+
+def evaluate(
+    pure_csv: str = PURE_ANNOTATED_CSV,
+    promise_csv: str = PROMISE_CSV,
+    results_dir: str = RESULTS_DIR,
+    quality_threshold: float = 35.0,
+    margin: float = 5.0,
+    random_state: int = 42,
+) -> Dict[str, float]:
+    """
+    Report held-out category accuracy, routing accuracy and latency per 1k sentences.
+
+    Routing accuracy compares the routing decision made from the cross-validated
+    prior against the decision the observed mean LLM score would have implied
+    (send if the LLM judges scored the requirement below the threshold).
+    """
+    category_df = load_category_data(pure_csv, promise_csv)
+    quality_df = load_quality_data(results_dir)
+    if len(quality_df) < 5:
+        raise ValueError(f"Not enough scored requirements in '{results_dir}'.")
+
+    train_df, test_df = train_test_split(
+        category_df,
+        test_size=0.2,
+        random_state=random_state,
+        stratify=category_df["category"],
+    )
+    start = time.perf_counter()
+    category_model = PreClassifier._category_pipeline().fit(
+        train_df["text"], train_df["category"]
+    )
+    train_seconds = time.perf_counter() - start
+    category_accuracy = float(
+        np.mean(category_model.predict(test_df["text"]) == test_df["category"])
+    )
+
+    # Out-of-fold priors, so routing is judged on requirements the model has not seen
+    router = PreClassifier(quality_threshold=quality_threshold, margin=margin)
+    priors = np.zeros(len(quality_df))
+    folds = KFold(n_splits=5, shuffle=True, random_state=random_state)
+    for train_idx, test_idx in folds.split(quality_df):
+        fold_model = PreClassifier._quality_pipeline().fit(
+            quality_df["text"].iloc[train_idx], quality_df["score"].iloc[train_idx]
+        )
+        priors[test_idx] = fold_model.predict(quality_df["text"].iloc[test_idx])
+
+    sent = np.array([router.should_send(p) for p in priors])
+    needed = quality_df["score"].to_numpy() < quality_threshold
+    routing_accuracy = float(np.mean(sent == needed))
+
+    router.category_model = category_model
+    router.quality_model = PreClassifier._quality_pipeline().fit(
+        quality_df["text"], quality_df["score"]
+    )
+    sample = test_df["text"].sample(
+        n=1000, replace=len(test_df) < 1000, random_state=random_state
+    )
+    start = time.perf_counter()
+    router.route(sample.tolist())
+    latency_per_1k = time.perf_counter() - start
+
+    return {
+        "category_train_seconds": train_seconds,
+        "category_accuracy": category_accuracy,
+        "quality_prior_mae": float(np.mean(np.abs(priors - quality_df["score"]))),
+        "routing_accuracy": routing_accuracy,
+        "llm_call_fraction": float(np.mean(sent)),
+        "missed_deficient": int(np.sum(needed & ~sent)),
+        "latency_seconds_per_1k": latency_per_1k,
+    }
+
+
+if __name__ == "__main__":
+    report = evaluate()
+    for key, value in report.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
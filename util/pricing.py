@@ -0,0 +1,69 @@
+"""
+Approximate list prices in USD per 1M tokens: (input, output, cached input).
+
+These are only used to estimate spend in telemetry and routing; update them when
+provider pricing changes. Models missing from the table are reported without cost.
+"""
+
+from typing import Dict, Optional, Tuple
+
+PRICES: Dict[str, Tuple[float, float, float]] = {
+    # OpenAI
+    "gpt-5": (1.25, 10.00, 0.125),
+    "gpt-5-mini": (0.25, 2.00, 0.025),
+    "gpt-5-nano": (0.05, 0.40, 0.005),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "gpt-3.5-turbo": (0.50, 1.50, 0.50),
+    # Anthropic
+    "claude-sonnet-4-20250514": (3.00, 15.00, 0.30),
+    "claude-3-5-haiku-latest": (0.80, 4.00, 0.08),
+    # Google (Gemma models are free on the Gemini API)
+    "gemini-2.5-pro": (1.25, 10.00, 0.31),
+    "gemini-2.5-flash": (0.30, 2.50, 0.075),
+    "gemini-2.5-flash-lite": (0.10, 0.40, 0.025),
+    "gemma-3-27b": (0.0, 0.0, 0.0),
+    "gemma-3-12b": (0.0, 0.0, 0.0),
+    "gemma-3-4b": (0.0, 0.0, 0.0),
+    "gemma-3-270m": (0.0, 0.0, 0.0),
+    # Mistral
+    "mistral-medium-latest": (0.40, 2.00, 0.40),
+    "magistral-medium-2507": (2.00, 5.00, 2.00),
+    # Together
+    "meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8": (0.27, 0.85, 0.27),
+    "meta-llama/Llama-4-Scout-17B-16E-Instruct": (0.18, 0.59, 0.18),
+    "openai/gpt-oss-120b": (0.15, 0.60, 0.15),
+    # DeepSeek, Qwen, Grok
+    "deepseek-chat": (0.27, 1.10, 0.07),
+    "deepseek-reasoner": (0.55, 2.19, 0.14),
+    "qwen-plus": (0.40, 1.20, 0.40),
+    "grok-3-mini": (0.30, 0.50, 0.075),
+}
+
+
+def estimate_cost(
+    model_name: str,
+    input_tokens: int,
+    output_tokens: int,
+    cached_tokens: int = 0,
+    prices: Optional[Dict[str, Tuple[float, float, float]]] = None,
+) -> Optional[float]:
+    """
+    Estimate the cost of a call in USD.
+
+    Args:
+        model_name (str): Model identifier as passed to the adapter.
+        input_tokens (int): All prompt tokens, including cached ones.
+        output_tokens (int): Billed output tokens, including reasoning tokens.
+        cached_tokens (int): Prompt tokens served from the provider's cache.
+
+    Returns:
+        float: Estimated cost, or None if the model has no known price.
+    """
+    price = (prices or PRICES).get(model_name)
+    if price is None:
+        return None
+    input_price, output_price, cached_price = price
+    uncached = max(input_tokens - cached_tokens, 0)
+    return (
+        uncached * input_price + cached_tokens * cached_price + output_tokens * output_price
+    ) / 1_000_000
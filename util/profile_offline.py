@@ -0,0 +1,63 @@
+"""
+Profile the scoring pipeline end to end against a recorded cassette (no network).
+
+Record a cassette once by wrapping a live model in main.py, e.g.
+    Cassette(GPT(model_name="gpt-5", system_prompt=scoring_prompt), mode="record")
+and then replay it here:
+    python -m util.profile_offline cassettes/gpt-5.jsonl --model gpt-5 --temperature 1
+"""
+
+import argparse
+import cProfile
+import pstats
+import time
+
+from models.cassette import Cassette
+from util.scoring import get_prompt, load_requirements, score_with_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("cassette", help="Path to the JSONL cassette")
+    parser.add_argument("--model", required=True, help="Recorded model name")
+    parser.add_argument("--temperature", type=float, default=0)
+    parser.add_argument("--prompt", default="mixture_of_opinions_v2.txt")
+    parser.add_argument("--prompt-dir", default="prompts/scoring")
+    parser.add_argument(
+        "--csv", default="data/software-requirements-dataset/requirements.csv"
+    )
+    parser.add_argument("--n", type=int, default=100)
+    parser.add_argument(
+        "--latency",
+        action="store_true",
+        help="Sleep for the recorded provider latency when replaying",
+    )
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    model = Cassette(
+        path=args.cassette,
+        mode="replay",
+        replay_latency=args.latency,
+        model_name=args.model,
+        temperature=args.temperature,
+        system_prompt=get_prompt(args.prompt, prompt_dir=args.prompt_dir),
+    )
+    requirements_df = load_requirements(args.csv, n=args.n)
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    results = score_with_model(model, requirements_df)
+    profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Scored {len(results)}/{len(requirements_df)} requirements in {elapsed:.3f}s "
+        f"(cassette hits: {model.hits}, misses: {model.misses})"
+    )
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
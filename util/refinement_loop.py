@@ -0,0 +1,343 @@
+"""
+Iterative refine-until-good loop (imgs/loop.png, imgs/checker.png).
+
+A refinement model rewrites the requirement and a separate checker model scores the
+rewrite, round after round. Each requirement stops on its own as soon as
+    - its overall score reaches the threshold ("passed"),
+    - the score has not improved by `min_improvement` for `patience` rounds
+      ("converged"),
+    - it used `max_rounds` rounds ("max_rounds"), or
+    - it spent its token budget, or the run's TokenBudget refused a call ("budget").
+
+A step whose call raises (e.g. a provider error) stops only its own requirement
+("failed"); the states built so far are still returned.
+
+Requirements do not move in lockstep: every refine/check step is its own task on a
+shared Scheduler and the next step is submitted as soon as the previous one returns.
+"""
+
+import json
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from models.base_model import BaseModel
+from util.json_utils import clean_json_output
+from util.pricing import estimate_cost
+from util.scheduler import Scheduler
+from util.scoring import (
+    RequirementResult,
+    extract_basic_score,
+    extract_refined_requirement,
+)
+from util.tokens import BudgetExceeded
+
+EARLY_EXITS = ("passed", "converged")
+FAILURES = ("failed", "refinement_failed")
+
+
+@dataclass
+class Round:
+    round: int
+    requirement: str
+    score: Optional[int]
+    score_response: Optional[dict]
+    refinement_response: Optional[dict] = None
+    tokens: int = 0
+    cost: float = 0.0
+
+
+@dataclass
+class LoopState:
+    requirement: str
+    requirement_type: str
+    rounds: List[Round] = field(default_factory=list)
+    stop_reason: Optional[str] = None
+    stale_rounds: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return sum(r.tokens for r in self.rounds)
+
+    @property
+    def cost(self) -> float:
+        return sum(r.cost for r in self.rounds)
+
+    @property
+    def best(self) -> Round:
+        scored = [r for r in self.rounds if r.score is not None]
+        return max(scored, key=lambda r: r.score) if scored else self.rounds[0]
+
+    def to_result(self, model_name: str) -> RequirementResult:
+        original, best = self.rounds[0], self.best
+        last_refinement = next(
+            (r.refinement_response for r in reversed(self.rounds) if r.refinement_response),
+            None,
+        )
+        return RequirementResult(
+            original_requirement=self.requirement,
+            requirement_type=self.requirement_type,
+            model_name=model_name,
+            score_response=original.score_response,
+            overall_score=original.score,
+            refined_requirement=best.requirement if best.round > 0 else None,
+            refined_response=last_refinement,
+            refined_score=best.score if best.round > 0 else None,
+            refined_score_raw_response=best.score_response if best.round > 0 else None,
+        )
+
+
+def _call(model: BaseModel, prompt: str) -> Tuple[Optional[dict], int, float]:
+    """Query a model and return the parsed JSON with the tokens and cost it used."""
+    response = model.query_with_retry(prompt)
+    usage = model.call_state()
+    tokens = usage.input_tokens + usage.output_tokens
+    if not tokens:
+        # Adapter reported no usage, fall back to a rough 4 characters per token
+        tokens = (len(model.system_prompt) + len(prompt) + len(response or "")) // 4
+    cost = estimate_cost(
+        model.model_name, usage.input_tokens, usage.output_tokens, usage.cached_tokens
+    )
+    return (clean_json_output(response) if response else None), tokens, cost or 0.0
+
+
+class RefinementLoop:
+    """
+    Alternate a refinement model and a checker model until each requirement converges.
+
+    Args:
+        refinement_model (BaseModel): Rewrites the requirement.
+        checker_model (BaseModel): Scores each version, in a fresh call every round.
+        refinement_template (str): Prompt with {{ REQUIREMENT }} / {{ SCORING_ANALYSIS }}.
+        threshold (int): Overall score at which a requirement passes.
+        max_rounds (int): Maximum refinement rounds per requirement.
+        min_improvement (int): Smallest score gain that counts as progress.
+        patience (int): Rounds without progress before stopping.
+        token_budget (int): Maximum tokens per requirement, None for no limit.
+        scheduler (Scheduler): Shared scheduler, a private one is created if None.
+    """
+
+    def __init__(
+        self,
+        refinement_model: BaseModel,
+        checker_model: BaseModel,
+        refinement_template: str,
+        threshold: int = 70,
+        max_rounds: int = 5,
+        min_improvement: int = 2,
+        patience: int = 1,
+        token_budget: Optional[int] = None,
+        scheduler: Optional[Scheduler] = None,
+        max_workers: int = 8,
+    ):
+        self.refinement_model = refinement_model
+        self.checker_model = checker_model
+        self.refinement_template = refinement_template
+        self.threshold = threshold
+        self.max_rounds = max_rounds
+        self.min_improvement = min_improvement
+        self.patience = patience
+        self.token_budget = token_budget
+        self._scheduler = scheduler
+        self._max_workers = max_workers
+
+    def _check(
+        self,
+        round_number: int,
+        text: str,
+        refinement: Optional[dict] = None,
+        refinement_tokens: int = 0,
+        refinement_cost: float = 0.0,
+    ) -> Round:
+        score_response, tokens, cost = _call(self.checker_model, text)
+        # The refinement call is accounted on the round it produced
+        return Round(
+            round=round_number,
+            requirement=text,
+            score=extract_basic_score(score_response) if score_response else None,
+            score_response=score_response,
+            refinement_response=refinement,
+            tokens=tokens + refinement_tokens,
+            cost=cost + refinement_cost,
+        )
+
+    def _refine(self, state: LoopState) -> Tuple[Optional[dict], int, float]:
+        last = state.rounds[-1]
+        prompt = self.refinement_template.replace(
+            "{{ REQUIREMENT }}", last.requirement
+        ).replace("{{ SCORING_ANALYSIS }}", json.dumps(last.score_response))
+        return _call(self.refinement_model, prompt)
+
+    def _stop_reason(self, state: LoopState) -> Optional[str]:
+        last = state.rounds[-1]
+        if last.score is None:
+            return "failed"
+        if last.score >= self.threshold:
+            return "passed"
+        if len(state.rounds) > 1:
+            previous_best = max(
+                (r.score for r in state.rounds[:-1] if r.score is not None), default=None
+            )
+            if previous_best is not None and last.score - previous_best < self.min_improvement:
+                state.stale_rounds += 1
+            else:
+                state.stale_rounds = 0
+            if state.stale_rounds >= self.patience:
+                return "converged"
+        if last.round >= self.max_rounds:
+            return "max_rounds"
+        if self.token_budget is not None and state.tokens >= self.token_budget:
+            return "budget"
+        return None
+
+    def run(self, requirements_df: pd.DataFrame) -> Tuple[List[LoopState], dict]:
+        """
+        Run the loop for every requirement.
+
+        Returns:
+            List[LoopState]: Per-requirement rounds and stop reason. A requirement
+                whose first check raised has no rounds.
+            dict: Rounds distribution, stop reasons and spend saved by early exit.
+        """
+        scheduler = self._scheduler or Scheduler(max_workers=self._max_workers)
+        checker, refiner = self.checker_model, self.refinement_model
+        states = [
+            LoopState(row["Requirement"], row["Type"])
+            for _, row in requirements_df.iterrows()
+        ]
+        pending: Dict[Future, Tuple[LoopState, str]] = {}
+        start = time.perf_counter()
+
+        for state in states:
+            future = scheduler.submit(checker.provider, self._check, 0, state.requirement)
+            pending[future] = (state, "check")
+
+        try:
+            while pending:
+                completed, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in completed:
+                    state, step = pending.pop(future)
+                    try:
+                        outcome = future.result()
+                    except BudgetExceeded as e:
+                        print(f"Stopping requirement: {state.requirement}: {e}")
+                        state.stop_reason = "budget"
+                        continue
+                    except Exception as e:
+                        print(f"{step.capitalize()} failed for {state.requirement}: {e}")
+                        state.stop_reason = "failed"
+                        continue
+                    if step == "check":
+                        state.rounds.append(outcome)
+                        state.stop_reason = self._stop_reason(state)
+                        if state.stop_reason is None:
+                            nxt = scheduler.submit(refiner.provider, self._refine, state)
+                            pending[nxt] = (state, "refine")
+                        continue
+
+                    refinement, tokens, cost = outcome
+                    text = extract_refined_requirement(refinement)
+                    if not text:
+                        state.stop_reason = "refinement_failed"
+                        continue
+                    nxt = scheduler.submit(
+                        checker.provider,
+                        self._check,
+                        len(state.rounds),
+                        text,
+                        refinement,
+                        tokens,
+                        cost,
+                    )
+                    pending[nxt] = (state, "check")
+        finally:
+            if self._scheduler is None:
+                scheduler.shutdown()
+
+        return states, self._report(states, time.perf_counter() - start)
+
+    def _report(self, states: List[LoopState], wall: float) -> dict:
+        rounds_used = [len(s.rounds) - 1 for s in states if s.rounds]
+        refinement_rounds = [r for s in states for r in s.rounds if r.round > 0]
+        tokens_per_round = (
+            sum(r.tokens for r in refinement_rounds) / len(refinement_rounds)
+            if refinement_rounds
+            else 0.0
+        )
+        cost_per_round = (
+            sum(r.cost for r in refinement_rounds) / len(refinement_rounds)
+            if refinement_rounds
+            else 0.0
+        )
+        # Rounds skipped by requirements that exited early, at the observed mean per
+        # round. Failed and budget-stopped requirements did not save anything.
+        skipped_rounds = sum(
+            self.max_rounds - (len(s.rounds) - 1)
+            for s in states
+            if s.rounds and s.stop_reason in EARLY_EXITS
+        )
+        return {
+            "requirements": len(states),
+            "wall_seconds": wall,
+            "rounds_distribution": dict(sorted(Counter(rounds_used).items())),
+            "stop_reasons": dict(Counter(s.stop_reason for s in states)),
+            "failed": sum(s.stop_reason in FAILURES for s in states),
+            "mean_rounds": sum(rounds_used) / len(rounds_used) if rounds_used else 0.0,
+            "tokens_used": sum(s.tokens for s in states),
+            "cost_used": sum(s.cost for s in states),
+            "rounds_saved": skipped_rounds,
+            "tokens_saved": skipped_rounds * tokens_per_round,
+            "cost_saved": skipped_rounds * cost_per_round,
+            "mean_score_gain": sum(
+                (s.best.score or 0) - (s.rounds[0].score or 0)
+                for s in states
+                if s.rounds and s.rounds[0].score is not None
+            )
+            / max(1, sum(1 for s in states if s.rounds and s.rounds[0].score is not None)),
+        }
+
+
+def print_report(report: dict):
+    print(
+        f"Refined {report['requirements']} requirements in {report['wall_seconds']:.1f}s, "
+        f"{report['mean_rounds']:.2f} rounds on average "
+        f"(mean score gain {report['mean_score_gain']:+.1f})"
+    )
+    print(f"Rounds used:  {report['rounds_distribution']}")
+    print(f"Stop reasons: {report['stop_reasons']}")
+    if report["failed"]:
+        print(f"Failed:       {report['failed']} requirements (not counted as savings)")
+    print(
+        f"Spent {report['tokens_used']} tokens / ${report['cost_used']:.4f}; early exit "
+        f"saved {report['rounds_saved']} rounds, ~{report['tokens_saved']:.0f} tokens / "
+        f"${report['cost_saved']:.4f}"
+    )
+
+
+if __name__ == "__main__":
+    from models import registry
+    from util.scoring import get_prompt, load_requirements, write_model_results
+
+    scoring_prompt = get_prompt(
+        "mixture_of_opinions_v2.txt", prompt_dir="prompts/scoring"
+    )
+    refinement_template = get_prompt(
+        "refinement_v2.txt", prompt_dir="prompts/refinement"
+    )
+
+    checker = registry.create("GPT", model_name="gpt-4.1", system_prompt=scoring_prompt)
+    refiner = registry.create(
+        "Mistral", model_name="mistral-medium-latest", temperature=0.25
+    )
+
+    loop = RefinementLoop(refiner, checker, refinement_template, threshold=70)
+    states, report = loop.run(load_requirements(n=20))
+    write_model_results(
+        f"{checker.model_name}__loop__{refiner.model_name}",
+        [state.to_result(checker.model_name) for state in states if state.rounds],
+    )
+    print_report(report)
@@ -0,0 +1,225 @@
+"""
+Compact in-memory storage for scoring results.
+
+A RequirementResult keeps every parsed response dict alive, which adds up to
+gigabytes at PURE scale across a dozen models. ResultTable stores the same fields
+column-wise:
+    - scores in typed arrays (array('h'), None stored as a sentinel),
+    - model names and requirement types interned in a small vocabulary and
+      stored as array('H') codes,
+    - responses serialized once, zlib-compressed and kept in a content-addressed
+      BlobStore (identical responses are stored once), optionally spilled to disk.
+
+Rows come back as CompactResult views whose `__dict__` is the same dict a
+RequirementResult gives, so write_model_results and json.dump work unchanged.
+score_with_model, the pipeline, the grid runner and IncrementalRun collect their
+results in a ResultTable.
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+_NO_SCORE = -32768  # Sentinel for None in the score arrays
+_NO_BLOB = -1
+
+# RequirementResult's fields, in its order (util.scoring imports this module, so
+# the dataclass cannot be imported here)
+FIELDS = [
+    "original_requirement",
+    "requirement_type",
+    "model_name",
+    "score_response",
+    "overall_score",
+    "refined_requirement",
+    "refined_response",
+    "refined_score",
+    "refined_score_raw_response",
+    "reused_from",
+    "served_by",
+]
+_BLOB_FIELDS = ["score_response", "refined_response", "refined_score_raw_response"]
+_SCORE_FIELDS = ["overall_score", "refined_score"]
+_NAME_FIELDS = ["model_name", "requirement_type", "served_by"]
+_TEXT_FIELDS = ["original_requirement", "refined_requirement", "reused_from"]
+
+
+class BlobStore:
+    """
+    Content-addressed store for JSON values, keyed by the sha256 of their serialization.
+
+    Values are zlib-compressed and kept in memory, or written to
+    `<directory>/<hash[:2]>/<hash>.json.z` when a directory is given. Rows refer to
+    blobs by a small integer id.
+
+    Args:
+        directory (str): Spill blobs to this directory instead of memory.
+        level (int): zlib compression level.
+    """
+
+    def __init__(self, directory: Optional[str] = None, level: int = 6):
+        self.directory = directory
+        self.level = level
+        self._ids: Dict[bytes, int] = {}
+        self._digests: List[bytes] = []
+        self._data: List[Optional[bytes]] = []  # Compressed blobs when kept in memory
+        self.stored_bytes = 0
+        self.raw_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def _path(self, digest: bytes) -> str:
+        name = digest.hex()
+        return os.path.join(self.directory, name[:2], f"{name}.json.z")
+
+    def put(self, value: Any) -> int:
+        """Store a JSON-serializable value and return its blob id."""
+        raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        digest = hashlib.sha256(raw).digest()
+        blob_id = self._ids.get(digest)
+        if blob_id is not None:
+            return blob_id
+
+        compressed = zlib.compress(raw, self.level)
+        self.raw_bytes += len(raw)
+        self.stored_bytes += len(compressed)
+        if self.directory:
+            path = self._path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(compressed)
+            compressed = None
+
+        blob_id = len(self._digests)
+        self._ids[digest] = blob_id
+        self._digests.append(digest)
+        self._data.append(compressed)
+        return blob_id
+
+    def get(self, blob_id: int) -> Any:
+        compressed = self._data[blob_id]
+        if compressed is None:
+            with open(self._path(self._digests[blob_id]), "rb") as f:
+                compressed = f.read()
+        return json.loads(zlib.decompress(compressed))
+
+    def key(self, blob_id: int) -> str:
+        """The content hash of a blob."""
+        return self._digests[blob_id].hex()
+
+
+class CompactResult:
+    """Read-only view of one row of a ResultTable."""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: "ResultTable", row: int):
+        self._table = table
+        self._row = row
+
+    def __getattr__(self, name: str) -> Any:
+        if name in FIELDS:
+            return self._table._get(self._row, name)
+        raise AttributeError(name)
+
+    @property
+    def __dict__(self) -> dict:
+        return {name: self._table._get(self._row, name) for name in FIELDS}
+
+    def to_result(self) -> "RequirementResult":
+        from util.scoring import RequirementResult
+
+        return RequirementResult(**self.__dict__)
+
+    def __repr__(self) -> str:
+        return f"CompactResult({self.__dict__!r})"
+
+
+class ResultTable:
+    """
+    Column-wise, append-only store of RequirementResults.
+
+    Args:
+        blobs (BlobStore): Where responses are stored. Tables can share one store,
+            e.g. one per run across all models.
+    """
+
+    def __init__(self, blobs: Optional[BlobStore] = None):
+        self.blobs = blobs if blobs is not None else BlobStore()
+        self._names: List[str] = []
+        self._name_codes: Dict[str, int] = {}
+        self._columns: Dict[str, Any] = {}
+        for name in _NAME_FIELDS:
+            self._columns[name] = array("H")
+        for name in _SCORE_FIELDS:
+            self._columns[name] = array("h")
+        for name in _BLOB_FIELDS:
+            self._columns[name] = array("i")
+        for name in _TEXT_FIELDS:
+            self._columns[name] = []
+
+    @classmethod
+    def from_results(
+        cls, results: Iterable["RequirementResult"], blobs: Optional[BlobStore] = None
+    ) -> "ResultTable":
+        table = cls(blobs)
+        table.extend(results)
+        return table
+
+    def _intern(self, name: str) -> int:
+        code = self._name_codes.get(name)
+        if code is None:
+            code = len(self._names)
+            self._names.append(name)
+            self._name_codes[name] = code
+        return code
+
+    def append(self, result: "RequirementResult"):
+        values = result.__dict__
+        for name in _NAME_FIELDS:
+            self._columns[name].append(self._intern(values[name]))
+        for name in _SCORE_FIELDS:
+            score = values[name]
+            self._columns[name].append(_NO_SCORE if score is None else int(score))
+        for name in _BLOB_FIELDS:
+            value = values[name]
+            self._columns[name].append(_NO_BLOB if value is None else self.blobs.put(value))
+        for name in _TEXT_FIELDS:
+            self._columns[name].append(values[name])
+
+    def extend(self, results: Iterable["RequirementResult"]):
+        for result in results:
+            self.append(result)
+
+    def _get(self, row: int, name: str) -> Any:
+        value = self._columns[name][row]
+        if name in _NAME_FIELDS:
+            return self._names[value]
+        if name in _SCORE_FIELDS:
+            return None if value == _NO_SCORE else value
+        if name in _BLOB_FIELDS:
+            return None if value == _NO_BLOB else self.blobs.get(value)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._columns["overall_score"])
+
+    def __getitem__(self, row: int) -> CompactResult:
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        return CompactResult(self, row % len(self))
+
+    def __iter__(self) -> Iterator[CompactResult]:
+        return (CompactResult(self, row) for row in range(len(self)))
+
+    def scores(self, name: str = "overall_score") -> array:
+        """The raw score column (None stored as -32768), e.g. for numpy.frombuffer."""
+        return self._columns[name]
+
+    def to_dicts(self) -> List[dict]:
+        return [result.__dict__ for result in self]
@@ -0,0 +1,163 @@
+"""
+Shared concurrency and rate-limit budget for model calls.
+
+One Scheduler owns a thread pool and, per provider, a request-rate token bucket and
+an in-flight limit. Everything submitted through it (grid cells, pipeline stages,
+...) competes for the same budget, so adding work never exceeds a provider's limits.
+
+Work for a rate-limited provider waits in that provider's queue, and a dispatcher
+thread per provider hands it to the pool only once a rate token and an in-flight
+slot are free. A throttled provider therefore never holds a pool worker while it
+waits, and the other providers keep the whole pool.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate_per_minute` requests with bursts up to `burst`."""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self._rate = rate_per_minute / 60.0
+        self._capacity = burst or max(1.0, self._rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity, self._tokens + (now - self._updated) * self._rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class Scheduler:
+    """
+    Thread pool with per-provider rate limits and in-flight caps.
+
+    Args:
+        max_workers (int): Total concurrent calls across all providers.
+        rate_limits (Dict[str, float]): Requests per minute per provider.
+        max_in_flight (Dict[str, int]): Concurrent calls per provider.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        rate_limits: Optional[Dict[str, float]] = None,
+        max_in_flight: Optional[Dict[str, int]] = None,
+    ):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._buckets = {
+            provider: TokenBucket(rpm) for provider, rpm in (rate_limits or {}).items()
+        }
+        self._in_flight = {
+            provider: threading.Semaphore(n)
+            for provider, n in (max_in_flight or {}).items()
+        }
+        self._queues: Dict[str, "queue.Queue[Optional[Tuple]]"] = {}
+        self._dispatchers: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def _run(self, provider: str, future: Future, fn: Callable, args, kwargs):
+        try:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        finally:
+            semaphore = self._in_flight.get(provider)
+            if semaphore:
+                semaphore.release()
+
+    def _to_pool(self, provider: str, task: Tuple):
+        future = task[0]
+        try:
+            slot = self._pool.submit(self._run, provider, *task)
+        except RuntimeError:  # The pool was shut down without waiting
+            slot = None
+        if slot is None:
+            future.cancel()
+            semaphore = self._in_flight.get(provider)
+            if semaphore:
+                semaphore.release()
+            return
+        # Work dropped by shutdown(cancel_futures=True) never runs _run
+        slot.add_done_callback(lambda slot: slot.cancelled() and future.cancel())
+
+    def _dispatch(self, provider: str, tasks: "queue.Queue[Optional[Tuple]]"):
+        semaphore = self._in_flight.get(provider)
+        bucket = self._buckets.get(provider)
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            future = task[0]
+            if future.cancelled():
+                continue
+            if semaphore:
+                semaphore.acquire()
+            if bucket:
+                bucket.acquire()
+            self._to_pool(provider, task)
+
+    def submit(self, provider: str, fn: Callable, *args, **kwargs) -> Future:
+        """Run `fn(*args, **kwargs)` under the budget of `provider`."""
+        future: Future = Future()
+        task = (future, fn, args, kwargs)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            if provider not in self._buckets and provider not in self._in_flight:
+                self._to_pool(provider, task)
+                return future
+            if provider not in self._queues:
+                self._queues[provider] = queue.Queue()
+                self._dispatchers[provider] = threading.Thread(
+                    target=self._dispatch,
+                    args=(provider, self._queues[provider]),
+                    name=f"scheduler-{provider}",
+                    daemon=True,
+                )
+                self._dispatchers[provider].start()
+            self._queues[provider].put(task)
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            for tasks in self._queues.values():
+                if cancel_futures:
+                    while True:
+                        try:
+                            task = tasks.get_nowait()
+                        except queue.Empty:
+                            break
+                        if task is not None:
+                            task[0].cancel()
+                tasks.put(None)
+        if wait:
+            for dispatcher in self._dispatchers.values():
+                dispatcher.join()
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self) -> "Scheduler":
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,376 @@
+"""
+Provider-agnostic scoring pipeline: the result type, prompt/data loading and the
+per-model scoring loop used by main.py.
+
+Nothing in here imports a provider adapter, so the pipeline can be driven offline
+(e.g. with a replayed Cassette model) without any API keys.
+"""
+
+import os
+import json
+import re  # cleaning text
+
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+from dataclasses import dataclass
+
+import tqdm
+
+from models.base_model import BaseModel
+from util.json_utils import clean_json_output
+from util.pre_classifier import RouteDecision
+from util.result_store import ResultTable
+from util.semantic_cache import ScoreIndex
+from util.tokens import BudgetExceeded, chunk_requirements
+
+
+@dataclass
+class RequirementResult:
+    original_requirement: str
+    requirement_type: str
+    model_name: str
+    score_response: str  # Store the full JSON response from scoring agent as string
+    overall_score: Optional[int] = None  # Score from scoring agent
+    refined_requirement: Optional[str] = (
+        None  # Refined requirement from refinement agent
+    )
+    refined_response: Optional[str] = None  # Full response from refinement agent
+    refined_score: Optional[int] = None  # Score from refinement agent, if applicable
+    refined_score_raw_response: Optional[str] = (
+        None  # Full JSON response from refinement agent, if applicable
+    )
+    reused_from: Optional[str] = (
+        None  # Similar requirement whose score was reused instead of querying
+    )
+    served_by: Optional[str] = None  # Endpoint that produced the score, "provider:model"
+
+
+def get_prompt(prompt_name: str, prompt_dir: str = "prompts") -> str:
+    prompt_path: str = os.path.join(prompt_dir, prompt_name)
+    if not os.path.exists(prompt_path):
+        raise FileNotFoundError(
+            f"Prompt file '{prompt_name}' not found in '{prompt_dir}'."
+        )
+
+    with open(prompt_path, "r") as file:
+        return file.read().strip()
+
+
+def clean_text(text: str) -> str:
+    """Clean corrupted characters from text."""
+    if not isinstance(text, str):
+        return str(text)
+
+    # Common character encoding fixes
+    replacements = {
+        "â€œ": '"',  # Left double quotation mark
+        "â€": '"',  # Right double quotation mark
+        "â€™": "'",  # Right single quotation mark
+        "â€˜": "'",  # Left single quotation mark
+        'â€"': "—",  # Em dash
+        'â€"': "–",  # En dash
+        "Â": "",  # Non-breaking space artifacts
+    }
+
+    cleaned = text
+    for old, new in replacements.items():
+        cleaned = cleaned.replace(old, new)
+
+    # Remove any remaining non-ASCII characters that might cause issues
+    cleaned = re.sub(r"[^\x00-\x7F]+", "", cleaned)
+
+    return cleaned.strip()
+
+
+def df_from_csv_fraction(
+    csv_file: str, fraction: float = 1.0, random_state: int = 42
+) -> pd.DataFrame:
+    if not os.path.exists(csv_file):
+        raise FileNotFoundError(f"CSV file '{csv_file}' not found.")
+    df = pd.read_csv(csv_file)
+    if fraction < 1.0:
+        df = df.sample(frac=fraction, random_state=random_state)
+    return df
+
+
+def df_from_csv_n(csv_file: str, n: int, random_state: int = 42) -> pd.DataFrame:
+    if not os.path.exists(csv_file):
+        raise FileNotFoundError(f"CSV file '{csv_file}' not found.")
+    df = pd.read_csv(csv_file)
+    df = df.sample(n=n, random_state=random_state)
+    return df
+
+
+def extract_basic_score(response: dict) -> Optional[int]:
+    """
+    Extract just the overall score
+    Returns score
+    """
+    try:
+        # Try different common score field names
+        score_fields = [
+            "overall_score",
+            "overall_quality_score",
+            "score",
+            "final_score",
+        ]
+
+        for field in score_fields:
+            if field in response:
+                score_value = response[field]
+                # Handle both integer and percentage string formats
+                if isinstance(score_value, str) and score_value.endswith("%"):
+                    return int(score_value.rstrip("%"))
+                elif isinstance(score_value, (int, float)):
+                    return int(score_value)
+
+        return None
+    except Exception as e:
+        print(f"Error extracting score: {e}")
+        return None
+
+
+def extract_refined_requirement(response: dict) -> Optional[str]:
+    """
+    Extract the refined requirement text from a refinement response.
+    Split requirements are joined with newlines.
+    """
+    if not response:
+        return None
+    refined = response.get("refined_requirements", response.get("refined_requirement"))
+    if isinstance(refined, str):
+        return refined.strip() or None
+    if isinstance(refined, list):
+        texts = [
+            item.get("requirement", "") if isinstance(item, dict) else str(item)
+            for item in refined
+        ]
+        return "\n".join(text.strip() for text in texts if text.strip()) or None
+    return None
+
+
+def refine_requirement(
+    result: RequirementResult, refinement_model: BaseModel, refinement_input: str
+) -> RequirementResult:
+    """
+    Refines a requirement by passing the original requirement and full scoring response
+    """
+    # Create refinement prompt with original requirement and full scoring context
+    prompt = refinement_input.replace("{{ REQUIREMENT }}", result.original_requirement)
+    prompt = prompt.replace("{{ SCORING_ANALYSIS }}", json.dumps(result.score_response))
+
+    refined_response = refinement_model.query_with_retry(prompt)
+    if not refined_response:
+        print(
+            f"No refinement for requirement: {result.original_requirement} from model: {refinement_model.model_name}"
+        )
+        return result
+
+    result.refined_response = clean_json_output(refined_response)
+    result.refined_requirement = extract_refined_requirement(result.refined_response)
+
+    return result
+
+
+def rescore_requirement(
+    result: RequirementResult, scoring_model: BaseModel
+) -> RequirementResult:
+    """
+    Scores the refined requirement in a fresh call (no shared context with the
+    original scoring or the refinement)
+    """
+    if not result.refined_requirement:
+        return result
+
+    response = scoring_model.query_with_retry(result.refined_requirement)
+    cleaned_response = clean_json_output(response) if response else None
+    if not cleaned_response:
+        print(
+            f"Failed to re-score refined requirement: {result.refined_requirement} from model: {scoring_model.model_name}"
+        )
+        return result
+
+    result.refined_score_raw_response = cleaned_response
+    result.refined_score = extract_basic_score(cleaned_response)
+    return result
+
+
+def load_requirements(
+    csv_file: str = "data/software-requirements-dataset/requirements.csv",
+    n: int = 100,
+    random_state: int = 42,
+) -> pd.DataFrame:
+    requirements_df = df_from_csv_n(csv_file, n=n, random_state=random_state)
+    requirements_df["Requirement"] = requirements_df["Requirement"].apply(clean_text)
+    print(f"Loaded {len(requirements_df)} requirements from {csv_file}")
+    return requirements_df
+
+
+def score_requirement(
+    model: BaseModel,
+    req: str,
+    req_type: str,
+    prompt: Optional[str] = None,
+    system_prompt: Optional[str] = None,
+) -> Optional[RequirementResult]:
+    """
+    Score a single requirement. The prompt defaults to the requirement itself and the
+    system prompt to the model's own.
+
+    Returns:
+        RequirementResult: The parsed result, or None if the model gave no usable JSON.
+    """
+    response = model.query_with_retry(prompt or req, system_prompt=system_prompt)
+    if not response:
+        print(f"No response for requirement: {req} from model: {model.model_name}")
+        return None
+
+    cleaned_response = clean_json_output(response)
+
+    if not cleaned_response:
+        print(
+            f"Failed to parse JSON response for requirement: {req} from model: {model.model_name}"
+        )
+        return None
+
+    overall_score = extract_basic_score(cleaned_response)
+
+    return RequirementResult(
+        original_requirement=req,
+        requirement_type=req_type,
+        model_name=model.model_name,
+        score_response=cleaned_response,
+        overall_score=overall_score,
+        refined_requirement=None,
+        refined_response=None,
+        refined_score=None,
+        refined_score_raw_response=None,
+        served_by=model.served_by(),
+    )
+
+
+def score_with_model(
+    model: BaseModel,
+    requirements_df: pd.DataFrame,
+    routes: Optional[Dict[str, RouteDecision]] = None,
+    score_index: Optional[ScoreIndex] = None,
+    progress: bool = True,
+) -> ResultTable:
+    """
+    Score every requirement in the dataframe with a single model. Requirements too
+    long for the model's context window are split into chunks that are scored
+    separately.
+
+    Args:
+        model (BaseModel): The scoring model.
+        requirements_df (pd.DataFrame): Requirements with "Requirement" and "Type" columns.
+        routes (Dict[str, RouteDecision]): Optional pre-classifier decisions per requirement.
+        score_index (ScoreIndex): Optional index for reusing near-duplicate scores.
+        progress (bool): Show a progress bar.
+
+    Returns:
+        ResultTable: One result per successfully scored requirement, stored compactly.
+            If the run's TokenBudget runs out, scoring stops and the results so far
+            are returned.
+    """
+    routes = routes or {}
+    model_results = ResultTable()
+    requirements_df = chunk_requirements(requirements_df, model)
+
+    for idx, row in tqdm.tqdm(
+        requirements_df.iterrows(),
+        desc=f"Scoring with {model.model_name}",
+        total=len(requirements_df),
+        disable=not progress,
+    ):
+        req = row["Requirement"]
+        req_type = row["Type"]
+
+        decision = routes.get(req)
+        if decision and not decision.send_to_llm:
+            continue
+        # Routed prompts are passed per call: the model may be shared between threads
+        system_prompt = (
+            get_prompt(decision.prompt_name, prompt_dir="prompts/scoring")
+            if decision and decision.prompt_name
+            else model.system_prompt
+        )
+
+        # Reuse (or anchor on) the score of a near-duplicate this model already scored
+        match = (
+            score_index.lookup(model.model_name, req, system_prompt)
+            if score_index is not None
+            else None
+        )
+        if score_index is not None and score_index.should_reuse(match):
+            model_results.append(
+                RequirementResult(
+                    original_requirement=req,
+                    requirement_type=req_type,
+                    model_name=model.model_name,
+                    score_response=match.score_response,
+                    overall_score=match.overall_score,
+                    reused_from=match.requirement,
+                )
+            )
+            continue
+        prompt = (
+            score_index.anchor_prompt(req, match) if score_index is not None else req
+        )
+
+        try:
+            result = score_requirement(
+                model, req, req_type, prompt=prompt, system_prompt=system_prompt
+            )
+        except BudgetExceeded as e:
+            print(
+                f"Budget exhausted while scoring with {model.model_name}, keeping "
+                f"{len(model_results)} results: {e}"
+            )
+            break
+        if result is None:
+            continue
+
+        model_results.append(result)
+        if score_index is not None:
+            score_index.record(
+                model.model_name,
+                req,
+                result.score_response,
+                result.overall_score,
+                system_prompt,
+                match,
+            )
+
+    return model_results
+
+
+def write_model_results(
+    model_name: str,
+    model_results: Iterable[RequirementResult],
+    output_dir: str = "results",
+) -> str:
+    """
+    Write one model's results to <output_dir>/<model>_scores.json.
+
+    Results are written one at a time, so a ResultTable or a generator is never
+    expanded into a list of dicts. The file is the same as json.dump(..., indent=4).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    safe_model_name = re.sub(r"[^A-Za-z0-9_]", "_", model_name)
+    output_file_path = os.path.join(output_dir, f"{safe_model_name}_scores.json")
+    with open(output_file_path, "w") as f:
+        separator = "[\n"
+        for result in model_results:
+            f.write(separator)
+            f.write(
+                "\n".join(
+                    "    " + line
+                    for line in json.dumps(result.__dict__, indent=4).splitlines()
+                )
+            )
+            separator = ",\n"
+        f.write("[]" if separator == "[\n" else "\n]")
+    print(f"Results for {model_name} written to {output_file_path}")
+    return output_file_path
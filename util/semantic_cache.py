@@ -0,0 +1,274 @@
+"""
+Local nearest-neighbour index of requirements that have already been scored.
+
+Many requirements across the datasets are paraphrases of each other. The index keeps
+one store per model and system prompt, so a new requirement that is close enough to
+one the same model has already scored with the same prompt can reuse that score (or
+get it as a few-shot anchor) instead of paying for another call. Scores from another
+prompt (e.g. a pre-classifier category prompt or an older prompt version) are never
+reused.
+
+Vectors are hashed TF-IDF-style n-grams (stateless, so the index can grow while
+results stream in) and candidates are found with random-hyperplane LSH tables.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.random_projection import SparseRandomProjection
+
+
+def prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class ScoredMatch:
+    requirement: str
+    similarity: float
+    overall_score: Optional[int]
+    score_response: dict
+
+
+@dataclass
+class _ModelStore:
+    texts: List[str] = field(default_factory=list)
+    vectors: List[sparse.csr_matrix] = field(default_factory=list)
+    scores: List[Optional[int]] = field(default_factory=list)
+    responses: List[dict] = field(default_factory=list)
+    exact: Dict[str, int] = field(default_factory=dict)
+    buckets: List[Dict[bytes, List[int]]] = field(default_factory=list)
+
+
+@dataclass
+class _ModelStats:
+    lookups: int = 0
+    hits: int = 0
+    drift: List[int] = field(default_factory=list)  # |reused - fresh| for verified hits
+
+
+class ScoreIndex:
+    """
+    Per-model, per-prompt approximate nearest-neighbour index over scored requirements.
+
+    Args:
+        similarity_threshold (float): Minimum cosine similarity for a reuse hit.
+        mode (str): "reuse" returns the stored score, "anchor" only adds the neighbour
+            as a few-shot example to the prompt.
+        verify_fraction (float): Fraction of reuse hits that are still sent to the
+            model, so the score drift introduced by reuse can be measured.
+        n_tables (int): Number of LSH tables.
+        n_planes (int): Hyperplanes (hash bits) per table.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.9,
+        mode: str = "reuse",
+        verify_fraction: float = 0.0,
+        n_tables: int = 4,
+        n_planes: int = 12,
+        n_features: int = 2**18,
+        random_state: int = 42,
+    ):
+        if mode not in ("reuse", "anchor"):
+            raise ValueError("Mode must be either 'reuse' or 'anchor'.")
+        self.similarity_threshold = similarity_threshold
+        self.mode = mode
+        self.verify_fraction = verify_fraction
+        self._n_tables = n_tables
+        self._n_planes = n_planes
+        self._rng = random.Random(random_state)
+
+        self._vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm="l2",
+        )
+        # Sparse projection only needs the input dimension, never the data
+        self._projection = SparseRandomProjection(
+            n_components=n_tables * n_planes,
+            dense_output=True,
+            random_state=random_state,
+        ).fit(sparse.csr_matrix((1, n_features)))
+
+        # Keyed by (model name, system prompt hash)
+        self._stores: Dict[Tuple[str, str], _ModelStore] = {}
+        self._stats: Dict[Tuple[str, str], _ModelStats] = {}
+
+    def _vectorize(self, text: str) -> sparse.csr_matrix:
+        return self._vectorizer.transform([text.lower()])
+
+    def _bucket_keys(self, vector: sparse.csr_matrix) -> List[bytes]:
+        bits = np.asarray(self._projection.transform(vector)).ravel() > 0
+        return [
+            np.packbits(bits[t * self._n_planes : (t + 1) * self._n_planes]).tobytes()
+            for t in range(self._n_tables)
+        ]
+
+    def _store(self, key: Tuple[str, str]) -> _ModelStore:
+        if key not in self._stores:
+            self._stores[key] = _ModelStore(buckets=[{} for _ in range(self._n_tables)])
+            self._stats[key] = _ModelStats()
+        return self._stores[key]
+
+    def __len__(self) -> int:
+        return sum(len(store.texts) for store in self._stores.values())
+
+    def add(
+        self,
+        model_name: str,
+        requirement: str,
+        score_response: dict,
+        overall_score: Optional[int],
+        system_prompt: str,
+    ):
+        """Add (or overwrite) a scored requirement for a model and system prompt."""
+        store = self._store((model_name, prompt_hash(system_prompt)))
+        if requirement in store.exact:
+            idx = store.exact[requirement]
+            store.scores[idx] = overall_score
+            store.responses[idx] = score_response
+            return
+
+        vector = self._vectorize(requirement)
+        idx = len(store.texts)
+        store.texts.append(requirement)
+        store.vectors.append(vector)
+        store.scores.append(overall_score)
+        store.responses.append(score_response)
+        store.exact[requirement] = idx
+        for table, key in zip(store.buckets, self._bucket_keys(vector)):
+            table.setdefault(key, []).append(idx)
+
+    def lookup(
+        self, model_name: str, requirement: str, system_prompt: str
+    ) -> Optional[ScoredMatch]:
+        """
+        Find the most similar requirement this model has already scored with this prompt.
+
+        Args:
+            model_name (str): Model whose scores may be reused.
+            requirement (str): The requirement about to be scored.
+            system_prompt (str): The system prompt the requirement will be scored with.
+
+        Returns:
+            ScoredMatch: The nearest neighbour above the similarity threshold, or None.
+        """
+        key = (model_name, prompt_hash(system_prompt))
+        store = self._store(key)
+        stats = self._stats[key]
+        stats.lookups += 1
+
+        if requirement in store.exact:
+            best_idx, best_similarity = store.exact[requirement], 1.0
+        else:
+            vector = self._vectorize(requirement)
+            candidates = set()
+            for table, key in zip(store.buckets, self._bucket_keys(vector)):
+                candidates.update(table.get(key, ()))
+            if not candidates:
+                return None
+            candidates = sorted(candidates)
+            similarities = (
+                sparse.vstack([store.vectors[i] for i in candidates]) @ vector.T
+            ).toarray().ravel()
+            best = int(np.argmax(similarities))
+            best_idx, best_similarity = candidates[best], float(similarities[best])
+
+        if best_similarity < self.similarity_threshold:
+            return None
+
+        stats.hits += 1
+        return ScoredMatch(
+            requirement=store.texts[best_idx],
+            similarity=best_similarity,
+            overall_score=store.scores[best_idx],
+            score_response=store.responses[best_idx],
+        )
+
+    def should_reuse(self, match: Optional[ScoredMatch]) -> bool:
+        """Whether a hit may skip the model call (some are sampled for verification)."""
+        if match is None or self.mode != "reuse":
+            return False
+        return self._rng.random() >= self.verify_fraction
+
+    def anchor_prompt(self, requirement: str, match: Optional[ScoredMatch]) -> str:
+        """Prefix the prompt with a similar, already assessed requirement."""
+        if match is None or self.mode != "anchor":
+            return requirement
+        return (
+            "For calibration, a similar requirement was assessed as follows.\n"
+            f"Reference requirement: {match.requirement}\n"
+            f"Reference assessment: {json.dumps(match.score_response)}\n\n"
+            f"Requirement to assess: {requirement}"
+        )
+
+    def record(
+        self,
+        model_name: str,
+        requirement: str,
+        score_response: dict,
+        overall_score: Optional[int],
+        system_prompt: str,
+        match: Optional[ScoredMatch] = None,
+    ):
+        """Add a fresh result and, if it was a sampled reuse hit, record the drift."""
+        if (
+            self.mode == "reuse"
+            and match is not None
+            and match.overall_score is not None
+            and overall_score is not None
+        ):
+            self._stats[(model_name, prompt_hash(system_prompt))].drift.append(
+                abs(overall_score - match.overall_score)
+            )
+        self.add(model_name, requirement, score_response, overall_score, system_prompt)
+
+    def report(self) -> Dict[str, dict]:
+        """Hit rate and score drift per model and prompt ("<model>@<prompt hash>")."""
+        report = {}
+        for (model_name, prompt_key), stats in self._stats.items():
+            report[f"{model_name}@{prompt_key}"] = {
+                "indexed": len(self._stores[(model_name, prompt_key)].texts),
+                "lookups": stats.lookups,
+                "hits": stats.hits,
+                "hit_rate": stats.hits / stats.lookups if stats.lookups else 0.0,
+                "verified_hits": len(stats.drift),
+                "mean_drift": float(np.mean(stats.drift)) if stats.drift else None,
+                "max_drift": max(stats.drift) if stats.drift else None,
+            }
+        return report
+
+    @classmethod
+    def from_results(
+        cls, system_prompt: str, results_dir: str = "results", **kwargs
+    ) -> "ScoreIndex":
+        """
+        Build an index from every *_scores.json file in a results directory.
+
+        Results files do not record their prompt, so `system_prompt` must be the
+        prompt they were scored with; they are only reused for calls with that prompt.
+        """
+        index = cls(**kwargs)
+        for path in sorted(glob.glob(os.path.join(results_dir, "*_scores.json"))):
+            with open(path, "r") as f:
+                for result in json.load(f):
+                    index.add(
+                        result["model_name"],
+                        result["original_requirement"],
+                        result["score_response"],
+                        result.get("overall_score"),
+                        system_prompt,
+                    )
+        print(f"Indexed {len(index)} scored requirements from {results_dir}")
+        return index
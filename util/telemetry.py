@@ -0,0 +1,234 @@
+"""
+Per-call instrumentation for every query made through BaseModel.query_with_retry.
+
+Each call produces one CallRecord which is passed to every registered sink:
+    JsonlSink       - append records to a JSON lines file
+    MemoryAggregator - keep running per-model totals for a live summary
+    PrometheusSink  - expose the totals on an HTTP endpoint in Prometheus text format
+
+Sinks are registered globally with `add_sink`, so instrumentation works for all
+adapters without changing how models are created.
+"""
+
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from util.pricing import estimate_cost
+
+
+@dataclass
+class CallRecord:
+    provider: str
+    model_name: str
+    prompt_hash: str
+    attempts: int
+    success: bool
+    error_class: Optional[str]  # Last error seen, also set when a retry succeeded
+    latency: float  # Wall-clock seconds for the whole retry loop
+    time_to_first_token: Optional[float] = None  # Only known for streaming calls
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
+    cost: Optional[float] = None
+    timestamp: float = field(default_factory=time.time)
+
+
+class Sink(ABC):
+    @abstractmethod
+    def emit(self, record: CallRecord):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlSink(Sink):
+    def __init__(self, path: str = "results/telemetry.jsonl"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def emit(self, record: CallRecord):
+        with self._lock:
+            self._file.write(json.dumps(asdict(record)) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+@dataclass
+class _ModelTotals:
+    provider: str
+    calls: int = 0
+    failures: int = 0
+    attempts: int = 0
+    latency_sum: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
+    cost: float = 0.0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+
+class MemoryAggregator(Sink):
+    """Running per-(provider, model) totals for a live summary."""
+
+    def __init__(self, keep_latencies: int = 10000):
+        self._keep_latencies = keep_latencies
+        self._totals: Dict[Tuple[str, str], _ModelTotals] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record: CallRecord):
+        with self._lock:
+            key = (record.provider, record.model_name)
+            totals = self._totals.setdefault(key, _ModelTotals(record.provider))
+            totals.calls += 1
+            totals.failures += 0 if record.success else 1
+            totals.attempts += record.attempts
+            totals.latency_sum += record.latency
+            if len(totals.latencies) < self._keep_latencies:
+                totals.latencies.append(record.latency)
+            totals.input_tokens += record.input_tokens
+            totals.output_tokens += record.output_tokens
+            totals.cached_tokens += record.cached_tokens
+            totals.reasoning_tokens += record.reasoning_tokens
+            totals.cost += record.cost or 0.0
+            if record.error_class:
+                totals.errors[record.error_class] = (
+                    totals.errors.get(record.error_class, 0) + 1
+                )
+
+    def totals(self) -> Dict[Tuple[str, str], _ModelTotals]:
+        with self._lock:
+            return dict(self._totals)
+
+    def summary(self) -> Dict[str, dict]:
+        """Per-model calls, retries, latency percentiles, tokens and cost."""
+        summary = {}
+        for (provider, model_name), t in self.totals().items():
+            latencies = sorted(t.latencies)
+            summary[model_name] = {
+                "provider": provider,
+                "calls": t.calls,
+                "failures": t.failures,
+                "retries": t.attempts - t.calls,
+                "mean_latency": t.latency_sum / t.calls if t.calls else 0.0,
+                "p95_latency": latencies[int(0.95 * (len(latencies) - 1))]
+                if latencies
+                else 0.0,
+                "input_tokens": t.input_tokens,
+                "output_tokens": t.output_tokens,
+                "cached_tokens": t.cached_tokens,
+                "reasoning_tokens": t.reasoning_tokens,
+                "cost_usd": round(t.cost, 6),
+                "errors": dict(t.errors),
+            }
+        return summary
+
+    def print_summary(self):
+        for model_name, stats in self.summary().items():
+            print(
+                f"{model_name} ({stats['provider']}): {stats['calls']} calls, "
+                f"{stats['failures']} failed, {stats['retries']} retries, "
+                f"mean {stats['mean_latency']:.2f}s, p95 {stats['p95_latency']:.2f}s, "
+                f"{stats['input_tokens']} in / {stats['output_tokens']} out tokens "
+                f"({stats['reasoning_tokens']} reasoning, {stats['cached_tokens']} cached), "
+                f"${stats['cost_usd']:.4f}"
+            )
+
+
+class PrometheusSink(MemoryAggregator):
+    """Serve running totals at http://<host>:<port>/metrics in Prometheus text format."""
+
+    def __init__(self, port: int = 9108, host: str = "127.0.0.1"):
+        super().__init__(keep_latencies=0)
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = sink.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def render(self) -> str:
+        metrics = {
+            "ai4re_calls_total": ("counter", lambda t: t.calls),
+            "ai4re_call_failures_total": ("counter", lambda t: t.failures),
+            "ai4re_attempts_total": ("counter", lambda t: t.attempts),
+            "ai4re_latency_seconds_sum": ("counter", lambda t: t.latency_sum),
+            "ai4re_input_tokens_total": ("counter", lambda t: t.input_tokens),
+            "ai4re_output_tokens_total": ("counter", lambda t: t.output_tokens),
+            "ai4re_cached_tokens_total": ("counter", lambda t: t.cached_tokens),
+            "ai4re_reasoning_tokens_total": ("counter", lambda t: t.reasoning_tokens),
+            "ai4re_cost_usd_total": ("counter", lambda t: t.cost),
+        }
+        totals = self.totals()
+        lines = []
+        for name, (kind, value) in metrics.items():
+            lines.append(f"# TYPE {name} {kind}")
+            for (provider, model_name), t in totals.items():
+                lines.append(
+                    f'{name}{{provider="{provider}",model="{model_name}"}} {value(t)}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_sinks: List[Sink] = []
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink: Sink) -> Sink:
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def emit(record: CallRecord):
+    if record.cost is None:
+        record.cost = estimate_cost(
+            record.model_name,
+            record.input_tokens,
+            record.output_tokens,
+            record.cached_tokens,
+        )
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.emit(record)
+        except Exception as e:
+            print(f"Telemetry sink {type(sink).__name__} failed: {e}")
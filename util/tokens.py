@@ -0,0 +1,391 @@
+"""
+Token estimates, output limits and a per-run token budget.
+
+Before every call, BaseModel.query_with_retry asks `plan_call` for an estimate of
+the prompt size and the output limit for that call:
+    - the output limit is sized from the JSON template in the system prompt
+      (every empty "" field in the template is a justification or rewritten text
+      to be generated), with headroom, plus a reasoning allowance for thinking
+      models, capped at the model's maximum output;
+    - prompts that do not fit the context window next to that output are refused
+      before anything is paid for (see `chunk_requirements` for long PURE
+      paragraphs);
+    - the estimate is reserved against the active TokenBudget, if one is set, and
+      settled with the usage the provider reports.
+
+Token counts use tiktoken for OpenAI-tokenizer models when it is installed
+(pip install tiktoken); otherwise, and for other providers, a characters-per-token
+ratio per provider. Estimates only need to be close enough to size limits.
+"""
+
+import functools
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from util.pricing import estimate_cost
+
+try:
+    import tiktoken
+except ImportError:  # Optional, the character heuristic is used instead
+    tiktoken = None
+
+
+class PromptTooLong(ValueError):
+    """The prompt does not fit the model's context window with room for the answer."""
+
+
+class BudgetExceeded(RuntimeError):
+    """The call would take the run past its token or cost budget."""
+
+
+# (context window, maximum output tokens). Matched exactly first, then by prefix.
+MODEL_LIMITS: Dict[str, Tuple[int, int]] = {
+    # OpenAI
+    "gpt-5": (400_000, 128_000),
+    "gpt-4.1": (1_047_576, 32_768),
+    "gpt-3.5-turbo": (16_385, 4_096),
+    # Anthropic
+    "claude-sonnet-4": (200_000, 64_000),
+    "claude-3-5-haiku": (200_000, 8_192),
+    # Google
+    "gemini-2.5": (1_048_576, 65_536),
+    "gemma-3-270m": (32_768, 8_192),
+    "gemma-3": (131_072, 8_192),
+    # Mistral
+    "mistral-medium": (131_072, 32_768),
+    "magistral-medium": (40_960, 40_000),
+    # Together
+    "meta-llama/Llama-4-Maverick": (1_048_576, 16_384),
+    "meta-llama/Llama-4-Scout": (327_680, 16_384),
+    "openai/gpt-oss": (131_072, 32_768),
+    # DeepSeek, Qwen, Grok
+    "deepseek-chat": (65_536, 8_192),
+    "deepseek-reasoner": (65_536, 65_536),
+    "qwen-plus": (131_072, 16_384),
+    "grok-3": (131_072, 16_384),
+}
+DEFAULT_LIMITS = (32_768, 4_096)
+
+# Models that spend output tokens on hidden reasoning before the answer
+REASONING_PREFIXES = (
+    "gpt-5",
+    "o1",
+    "o3",
+    "o4",
+    "gemini-2.5",  # Thinking tokens count against max_output_tokens
+    "magistral",
+    "deepseek-reasoner",
+    "openai/gpt-oss",
+    "grok-3-mini",
+)
+REASONING_ALLOWANCE = 16_000
+
+# Characters per token when no tokenizer is available, by BaseModel.provider
+CHARS_PER_TOKEN: Dict[str, float] = {
+    "GPT": 4.0,
+    "Claude": 3.5,
+    "Google": 4.0,
+    "MistralModel": 3.7,
+    "DeepSeek": 3.8,
+    "Qwen": 3.8,
+    "Grok": 4.0,
+    "Together": 3.8,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5  # Err on the side of more tokens
+
+TEXT_FIELD_TOKENS = 80  # Typical justification / rewritten requirement length
+OUTPUT_HEADROOM = 1.5
+MIN_OUTPUT_TOKENS = 1_024
+# Prompts that ask for reasoning in prose before the JSON (chain_of_thought_v0,
+# tree_of_thought_v0, generated_knowledge_v0)
+PROSE_FIRST = re.compile(
+    r"step[- ]by[- ]step|\bfirst\b[^.\n]*\bthen\b|\bthen (?:respond|conclude|provide)\b",
+    re.IGNORECASE,
+)
+MIN_PROSE_TOKENS = 1_000
+TRUNCATION_RETRY_FACTOR = 4  # Output limit multiplier for the one retry after a cut-off
+
+
+def model_limits(model_name: str) -> Tuple[int, int]:
+    if model_name in MODEL_LIMITS:
+        return MODEL_LIMITS[model_name]
+    matches = [prefix for prefix in MODEL_LIMITS if model_name.startswith(prefix)]
+    return MODEL_LIMITS[max(matches, key=len)] if matches else DEFAULT_LIMITS
+
+
+def is_reasoning_model(model_name: str) -> bool:
+    return model_name.startswith(REASONING_PREFIXES)
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model_name: str):
+    if tiktoken is None:
+        return None
+    name = model_name.split("/")[-1]
+    if not name.startswith(("gpt", "o1", "o3", "o4")):
+        return None
+    try:
+        return tiktoken.encoding_for_model(name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, provider: str = "", model_name: str = "") -> int:
+    """Estimated number of tokens in `text` for the given provider and model."""
+    if not text:
+        return 0
+    encoding = _encoding(model_name)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    ratio = CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+    return int(len(text) / ratio) + 1
+
+
+def _json_template(text: str) -> Optional[Tuple[int, int]]:
+    """Span of the last balanced {...} block in text."""
+    end = text.rfind("}")
+    if end == -1:
+        return None
+    depth = 0
+    for i in range(end, -1, -1):
+        if text[i] == "}":
+            depth += 1
+        elif text[i] == "{":
+            depth -= 1
+            if depth == 0:
+                return i, end + 1
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def expected_output_tokens(system_prompt: str, prompt: str = "") -> int:
+    """
+    Expected answer size for a prompt whose output format is a JSON template.
+
+    The template (the last {...} block of the system prompt, or of the user prompt
+    for templates sent as the user message, e.g. refinement prompts) is counted as
+    is, and every empty string field in it as TEXT_FIELD_TOKENS of generated text.
+    Prompts that ask for reasoning in prose before the JSON also get the length of
+    their instructions (the worked example is about as long as the reasoning it asks
+    for), at least MIN_PROSE_TOKENS. Prompts without a template get MIN_OUTPUT_TOKENS.
+    """
+    text = system_prompt
+    span = _json_template(system_prompt)
+    if span is None and prompt:
+        text, span = prompt, _json_template(prompt)
+    if span is None:
+        return MIN_OUTPUT_TOKENS
+    start, end = span
+    template = text[start:end]
+    expected = count_tokens(template) + template.count('""') * TEXT_FIELD_TOKENS
+    if PROSE_FIRST.search(text[:start]):
+        expected += max(MIN_PROSE_TOKENS, count_tokens(text[:start]))
+    return expected
+
+
+@dataclass
+class CallPlan:
+    input_tokens: int
+    max_output_tokens: int
+    context_window: int
+
+
+def plan_call(
+    provider: str, model_name: str, system_prompt: str, prompt: str
+) -> CallPlan:
+    """
+    Size a call before sending it.
+
+    Raises:
+        PromptTooLong: If the prompt does not fit next to the expected answer.
+    """
+    context_window, max_output = model_limits(model_name)
+    input_tokens = count_tokens(system_prompt, provider, model_name) + count_tokens(
+        prompt, provider, model_name
+    )
+    expected = max(
+        MIN_OUTPUT_TOKENS,
+        int(expected_output_tokens(system_prompt, prompt) * OUTPUT_HEADROOM),
+    )
+    if is_reasoning_model(model_name):
+        expected += REASONING_ALLOWANCE
+    max_output_tokens = min(expected, max_output)
+
+    if input_tokens + max_output_tokens > context_window:
+        raise PromptTooLong(
+            f"Prompt of ~{input_tokens} tokens plus {max_output_tokens} output tokens "
+            f"exceeds the {context_window}-token context of {model_name}."
+        )
+    return CallPlan(input_tokens, max_output_tokens, context_window)
+
+
+def raised_output_limit(model_name: str, limit: Optional[int]) -> int:
+    """Output limit for the one retry of an answer cut off at `limit`."""
+    _, max_output = model_limits(model_name)
+    return min(max_output, int((limit or MIN_OUTPUT_TOKENS) * TRUNCATION_RETRY_FACTOR))
+
+
+class TokenBudget:
+    """
+    Token and cost budget for a run, shared by every model.
+
+    Each call reserves its estimated worst case (prompt + output limit) before it
+    is sent and is settled with the usage the provider reports afterwards, so
+    concurrent calls cannot overshoot the budget together.
+
+    Args:
+        max_tokens (int): Total input + output tokens for the run.
+        max_cost (float): Total estimated USD for the run.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, max_cost: Optional[float] = None):
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.spent_tokens = 0
+        self.spent_cost = 0.0
+        self.reserved_tokens = 0
+        self.reserved_cost = 0.0
+        self.calls = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, model_name: str, plan: CallPlan) -> Tuple[int, float]:
+        tokens = plan.input_tokens + plan.max_output_tokens
+        cost = estimate_cost(model_name, plan.input_tokens, plan.max_output_tokens) or 0.0
+        with self._lock:
+            over_tokens = (
+                self.max_tokens is not None
+                and self.spent_tokens + self.reserved_tokens + tokens > self.max_tokens
+            )
+            over_cost = (
+                self.max_cost is not None
+                and self.spent_cost + self.reserved_cost + cost > self.max_cost
+            )
+            if over_tokens or over_cost:
+                self.refused += 1
+                raise BudgetExceeded(
+                    f"Run budget exhausted: {self.spent_tokens} tokens / "
+                    f"${self.spent_cost:.4f} spent, call needs up to {tokens} tokens / ${cost:.4f}."
+                )
+            self.reserved_tokens += tokens
+            self.reserved_cost += cost
+        return tokens, cost
+
+    def settle(
+        self,
+        reservation: Tuple[int, float],
+        model_name: str,
+        input_tokens: int,
+        output_tokens: int,
+        cached_tokens: int = 0,
+    ):
+        cost = estimate_cost(model_name, input_tokens, output_tokens, cached_tokens) or 0.0
+        with self._lock:
+            self.reserved_tokens -= reservation[0]
+            self.reserved_cost -= reservation[1]
+            self.spent_tokens += input_tokens + output_tokens
+            self.spent_cost += cost
+            self.calls += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "refused": self.refused,
+                "spent_tokens": self.spent_tokens,
+                "spent_cost": self.spent_cost,
+                "max_tokens": self.max_tokens,
+                "max_cost": self.max_cost,
+            }
+
+
+_budget: Optional[TokenBudget] = None
+
+
+def set_budget(budget: Optional[TokenBudget]) -> Optional[TokenBudget]:
+    """Make `budget` the run budget for every model call (None removes it)."""
+    global _budget
+    _budget = budget
+    return budget
+
+
+def get_budget() -> Optional[TokenBudget]:
+    return _budget
+
+
+def chunk_text(text: str, max_tokens: int, provider: str = "", model_name: str = "") -> List[str]:
+    """
+    Split text into chunks of at most ~max_tokens, on sentence boundaries where
+    possible (and on whitespace inside overly long sentences).
+    """
+    if count_tokens(text, provider, model_name) <= max_tokens:
+        return [text]
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?;])\s+", text.strip()):
+        if count_tokens(sentence, provider, model_name) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words, current = sentence.split(), []
+        for word in words:
+            if current and count_tokens(" ".join(current + [word]), provider, model_name) > max_tokens:
+                pieces.append(" ".join(current))
+                current = []
+            current.append(word)
+        if current:
+            pieces.append(" ".join(current))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        candidate = f"{current} {piece}".strip()
+        if current and count_tokens(candidate, provider, model_name) > max_tokens:
+            chunks.append(current)
+            current = piece
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_requirements(
+    requirements_df: pd.DataFrame, model, max_input_tokens: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Split requirements that would not fit in a call to `model` into several rows.
+
+    Args:
+        requirements_df (pd.DataFrame): Requirements with "Requirement" and "Type" columns.
+        model (BaseModel): The model the requirements will be sent to.
+        max_input_tokens (int): Limit for a single requirement. Defaults to what fits
+            in the context window next to the system prompt and the expected answer.
+
+    Returns:
+        pd.DataFrame: The same rows, long ones replaced by their chunks. A "Chunk"
+        column ("2/3") marks the split rows.
+    """
+    provider, model_name = model.provider, model.model_name
+    if max_input_tokens is None:
+        empty = plan_call(provider, model_name, model.system_prompt, "")
+        max_input_tokens = (
+            empty.context_window - empty.input_tokens - empty.max_output_tokens
+        )
+
+    rows, split = [], 0
+    for _, row in requirements_df.iterrows():
+        chunks = chunk_text(row["Requirement"], max_input_tokens, provider, model_name)
+        split += len(chunks) > 1
+        for i, chunk in enumerate(chunks):
+            rows.append(
+                {
+                    **row.to_dict(),
+                    "Requirement": chunk,
+                    "Chunk": f"{i + 1}/{len(chunks)}" if len(chunks) > 1 else None,
+                }
+            )
+    if split:
+        print(f"Split {split} over-long requirements into chunks of <= {max_input_tokens} tokens")
+    return pd.DataFrame(rows, columns=list(requirements_df.columns) + ["Chunk"])
@@ -0,0 +1,459 @@
+"""
+SQLite-backed work queue for scoring across processes and hosts.
+
+A coordinator enqueues one task per (requirement, model configuration) from a grid
+declaration (see util/grid.py, only "scoring" grids). Any number of worker processes
+lease tasks, score them with their own API keys and commit the RequirementResult.
+A merge step writes the usual per-model `<model>_scores.json` files.
+
+    python -m util.work_queue enqueue grids/scoring_sweep.json --db results/queue.db
+    python -m util.work_queue work --db results/queue.db --worker-id box-1 --threads 8
+    python -m util.work_queue status --db results/queue.db
+    python -m util.work_queue merge --db results/queue.db --output-dir results
+
+Leases expire: a task leased by a worker that crashed goes back to the queue after
+`lease_seconds`, and the remaining workers keep polling until it is picked up. An
+expired lease counts as an attempt, so a task that keeps crashing its worker ends
+up "failed" instead of being leased forever. Commits are idempotent, so the first
+result stored for a task wins. A worker whose lease expired while it was still
+running cannot add a second copy.
+
+A worker renews each lease just before running the task, so tasks waiting behind
+others in the same leased batch do not expire unnoticed. When the run's token
+budget is spent, the worker hands its leased tasks back without charging an
+attempt and stops.
+
+Workers on several hosts need the database on a shared file system with working
+file locks. NFS locking is often unreliable with SQLite.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from models import registry
+from models.base_model import BaseModel
+from util.grid import _sample, build_cells
+from util.scoring import RequirementResult, score_requirement, write_model_results
+from util.tokens import BudgetExceeded
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    config_id TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    temperature REAL NOT NULL,
+    model_kwargs TEXT NOT NULL,
+    system_prompt TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    config_id TEXT NOT NULL REFERENCES configs(config_id),
+    position INTEGER NOT NULL,
+    requirement TEXT NOT NULL,
+    requirement_type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, lease_expires);
+CREATE TABLE IF NOT EXISTS results (
+    task_id TEXT PRIMARY KEY REFERENCES tasks(task_id),
+    worker TEXT NOT NULL,
+    result TEXT NOT NULL,
+    completed_at REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class Task:
+    task_id: str
+    config_id: str
+    requirement: str
+    requirement_type: str
+    attempts: int
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open the queue, creating it if needed. Transactions are explicit."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def enqueue(db_path: str, spec: dict) -> int:
+    """
+    Enqueue every cell row of a scoring grid. Re-enqueueing the same grid is a no-op.
+
+    Returns:
+        int: Number of new tasks.
+    """
+    if spec.get("stage", "scoring") != "scoring":
+        raise ValueError("The work queue only runs scoring grids.")
+    cells = build_cells(spec, _sample(spec))
+
+    conn = connect(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        before = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        for cell in cells:
+            conn.execute(
+                "INSERT OR IGNORE INTO configs VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    cell.cell_id,
+                    cell.provider,
+                    cell.model_name,
+                    cell.temperature,
+                    json.dumps(cell.model_kwargs),
+                    cell.system_prompt,
+                ),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks "
+                "(task_id, config_id, position, requirement, requirement_type) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        f"{cell.cell_id}:{position}:{key}",
+                        cell.cell_id,
+                        position,
+                        requirement,
+                        req_type,
+                    )
+                    for position, (key, requirement, req_type, _) in enumerate(cell.rows)
+                ],
+            )
+        added = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] - before
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    print(f"Enqueued {added} new tasks for {len(cells)} model configurations")
+    return added
+
+
+class Worker:
+    """
+    Lease, run and commit tasks until the queue is drained.
+
+    A worker that finds nothing to lease keeps polling while other workers hold
+    leases, so tasks of a crashed worker are picked up once their lease expires.
+    All threads stop once one of them runs out of token budget.
+
+    Args:
+        db_path (str): Path of the queue database.
+        worker_id (str): Name recorded on leases and results.
+        providers (List[str]): Only lease tasks for these providers (the ones this
+            host has keys for). None leases everything.
+        threads (int): Tasks run concurrently in this process.
+        lease_seconds (float): Lease length. Should exceed a task's worst-case time,
+            including retries.
+        batch_size (int): Tasks leased per round-trip to the database.
+        max_attempts (int): Failed attempts, expired leases included, before a task
+            is marked "failed".
+        poll_seconds (float): Wait between lease attempts while other workers hold
+            the remaining tasks.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        worker_id: Optional[str] = None,
+        providers: Optional[List[str]] = None,
+        threads: int = 4,
+        lease_seconds: float = 600,
+        batch_size: int = 4,
+        max_attempts: int = 3,
+        poll_seconds: float = 5.0,
+    ):
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.providers = providers
+        self.threads = threads
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self._models: Dict[str, BaseModel] = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self._budget_exhausted = threading.Event()
+        connect(db_path).close()
+
+    def _model(self, conn: sqlite3.Connection, config_id: str) -> BaseModel:
+        with self._lock:
+            if config_id not in self._models:
+                provider, temperature, model_kwargs, system_prompt = conn.execute(
+                    "SELECT provider, temperature, model_kwargs, system_prompt "
+                    "FROM configs WHERE config_id = ?",
+                    (config_id,),
+                ).fetchone()
+                self._models[config_id] = registry.create(
+                    provider,
+                    temperature=temperature,
+                    system_prompt=system_prompt,
+                    **json.loads(model_kwargs),
+                )
+            return self._models[config_id]
+
+    def _provider_filter(self) -> str:
+        if not self.providers:
+            return ""
+        return f" AND c.provider IN ({', '.join('?' for _ in self.providers)})"
+
+    def remaining(self, conn: sqlite3.Connection) -> int:
+        """Pending or leased tasks this worker could still run."""
+        return conn.execute(
+            "SELECT COUNT(*) FROM tasks t JOIN configs c ON c.config_id = t.config_id "
+            f"WHERE t.status IN ('pending', 'leased'){self._provider_filter()}",
+            self.providers or [],
+        ).fetchone()[0]
+
+    def lease(self, conn: sqlite3.Connection) -> List[Task]:
+        """
+        Atomically lease pending tasks. Expired leases are reclaimed first and
+        charged an attempt, since their worker crashed or overran the lease.
+        """
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE tasks SET attempts = attempts + 1, "
+                "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END, "
+                "lease_owner = NULL, lease_expires = NULL "
+                "WHERE status = 'leased' AND lease_expires < ?",
+                (self.max_attempts, now),
+            )
+            rows = conn.execute(
+                "SELECT t.task_id, t.config_id, t.requirement, t.requirement_type, t.attempts "
+                "FROM tasks t JOIN configs c ON c.config_id = t.config_id "
+                f"WHERE t.status = 'pending'{self._provider_filter()} "
+                "ORDER BY t.config_id, t.position LIMIT ?",
+                (self.providers or []) + [self.batch_size],
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ? "
+                "WHERE task_id = ?",
+                [(self.worker_id, now + self.lease_seconds, row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [Task(*row) for row in rows]
+
+    def renew(self, conn: sqlite3.Connection, task: Task) -> bool:
+        """
+        Extend the lease on a task about to run.
+
+        Returns:
+            bool: False if the lease was reclaimed by another worker in the meantime.
+        """
+        cursor = conn.execute(
+            "UPDATE tasks SET lease_expires = ? "
+            "WHERE task_id = ? AND status = 'leased' AND lease_owner = ?",
+            (time.time() + self.lease_seconds, task.task_id, self.worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, conn: sqlite3.Connection, tasks: List[Task]):
+        """Hand leased tasks back to the queue without charging an attempt."""
+        conn.executemany(
+            "UPDATE tasks SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+            "WHERE task_id = ? AND status = 'leased' AND lease_owner = ?",
+            [(task.task_id, self.worker_id) for task in tasks],
+        )
+
+    def commit(self, conn: sqlite3.Connection, task: Task, result: Optional[RequirementResult]):
+        """Store a result (first one wins) or release the task for another attempt."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if result is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)",
+                    (task.task_id, self.worker_id, json.dumps(result.__dict__), time.time()),
+                )
+                conn.execute(
+                    "UPDATE tasks SET status = 'done', lease_expires = NULL WHERE task_id = ?",
+                    (task.task_id,),
+                )
+            else:
+                # Only release a lease we still hold; another worker may own it now
+                status = "failed" if task.attempts + 1 >= self.max_attempts else "pending"
+                conn.execute(
+                    "UPDATE tasks SET status = ?, attempts = attempts + 1, "
+                    "lease_owner = NULL, lease_expires = NULL "
+                    "WHERE task_id = ? AND status = 'leased' AND lease_owner = ?",
+                    (status, task.task_id, self.worker_id),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _loop(self):
+        conn = connect(self.db_path)  # SQLite connections are per thread
+        try:
+            while not self._budget_exhausted.is_set():
+                tasks = self.lease(conn)
+                if not tasks:
+                    if not self.remaining(conn):
+                        return
+                    # Leased by other workers; wait for them to finish or expire
+                    time.sleep(self.poll_seconds)
+                    continue
+                for index, task in enumerate(tasks):
+                    if self._budget_exhausted.is_set():
+                        self.release(conn, tasks[index:])
+                        break
+                    # Earlier tasks of the batch may have outlasted this lease
+                    if not self.renew(conn, task):
+                        continue
+                    try:
+                        model = self._model(conn, task.config_id)
+                        result = score_requirement(
+                            model, task.requirement, task.requirement_type
+                        )
+                    except BudgetExceeded as e:
+                        print(f"Worker {self.worker_id} stopping: {e}")
+                        self._budget_exhausted.set()
+                        self.release(conn, tasks[index:])
+                        break
+                    except Exception as e:
+                        print(f"Task {task.task_id} failed: {e}")
+                        result = None
+                    self.commit(conn, task, result)
+                    with self._lock:
+                        if result is None:
+                            self.failed += 1
+                        else:
+                            self.completed += 1
+        finally:
+            conn.close()
+
+    def run(self):
+        """Work until no pending or leased tasks remain."""
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._loop, name=f"{self.worker_id}-{i}")
+            for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(
+            f"Worker {self.worker_id}: {self.completed} completed, {self.failed} failed "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+
+def status(db_path: str) -> Dict[str, Dict[str, int]]:
+    """Task counts per model configuration and status."""
+    conn = connect(db_path)
+    try:
+        counts: Dict[str, Dict[str, int]] = {}
+        for config_id, task_status, n in conn.execute(
+            "SELECT config_id, status, COUNT(*) FROM tasks GROUP BY config_id, status"
+        ):
+            counts.setdefault(config_id, {})[task_status] = n
+        return counts
+    finally:
+        conn.close()
+
+
+def merge(db_path: str, output_dir: str = "results") -> List[str]:
+    """
+    Write one scores file per model configuration, in enqueue order. Rows are
+    streamed from the database to the file.
+
+    Files are named after the model, as score_requirements does, unless the same
+    model appears with several prompts or temperatures; then the grid cell id is used.
+    """
+    conn = connect(db_path)
+    try:
+        configs = conn.execute(
+            "SELECT config_id, model_name FROM configs ORDER BY rowid"
+        ).fetchall()
+        model_counts: Dict[str, int] = {}
+        for _, model_name in configs:
+            model_counts[model_name] = model_counts.get(model_name, 0) + 1
+
+        paths = []
+        for config_id, model_name in configs:
+            rows = conn.execute(
+                "SELECT r.result FROM tasks t JOIN results r ON r.task_id = t.task_id "
+                "WHERE t.config_id = ? ORDER BY t.position",
+                (config_id,),
+            )
+            # Streamed from the cursor to the file, one result in memory at a time
+            results = (RequirementResult(**json.loads(row[0])) for row in rows)
+            name = model_name if model_counts[model_name] == 1 else config_id
+            paths.append(write_model_results(name, results, output_dir=output_dir))
+        return paths
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite work queue for scoring")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Enqueue a scoring grid")
+    enqueue_parser.add_argument("grid", help="Path to the grid JSON declaration")
+
+    work_parser = commands.add_parser("work", help="Lease and run tasks")
+    work_parser.add_argument("--worker-id")
+    work_parser.add_argument("--providers", nargs="+")
+    work_parser.add_argument("--threads", type=int, default=4)
+    work_parser.add_argument("--lease-seconds", type=float, default=600)
+    work_parser.add_argument("--batch-size", type=int, default=4)
+    work_parser.add_argument("--max-attempts", type=int, default=3)
+    work_parser.add_argument("--poll-seconds", type=float, default=5.0)
+
+    commands.add_parser("status", help="Show task counts")
+
+    merge_parser = commands.add_parser("merge", help="Write per-model scores files")
+    merge_parser.add_argument("--output-dir", default="results")
+
+    for sub in commands.choices.values():
+        sub.add_argument("--db", default="results/queue.db")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        with open(args.grid, "r") as f:
+            enqueue(args.db, json.load(f))
+    elif args.command == "work":
+        Worker(
+            args.db,
+            worker_id=args.worker_id,
+            providers=args.providers,
+            threads=args.threads,
+            lease_seconds=args.lease_seconds,
+            batch_size=args.batch_size,
+            max_attempts=args.max_attempts,
+            poll_seconds=args.poll_seconds,
+        ).run()
+    elif args.command == "status":
+        for config_id, counts in status(args.db).items():
+            print(f"{config_id}: {counts}")
+    else:
+        for path in merge(args.db, args.output_dir):
+            print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()